@@ -8,6 +8,7 @@ Builds an error formula and uses ABC's file_generation_cex to find a counterexam
 import argparse
 import os
 import re
+import shutil
 import subprocess
 import sys
 import tempfile
@@ -20,7 +21,7 @@ from src import runtime_env  # noqa: F401
 import numpy as np
 
 from src.logging_utils import cprint
-from src.preprocess import parse
+from src.qdimacs import load_qdimacs, open_qdimacs
 
 
 def _static_bin_path(bin_name):
@@ -48,7 +49,7 @@ def _skolem_module_info(skolem_path):
 
 def _convert_verilog(qdimacs_path):
 
-    with open(qdimacs_path, "r") as f:
+    with open_qdimacs(qdimacs_path) as f:
         lines = f.readlines()
 
     itr = 1
@@ -216,7 +217,9 @@ def _parse_cex(model, x_count, y_count):
 
 
 def check_skolem(qdimacs_path, skolem_path):
-    Xvar, Yvar, _ = parse(qdimacs_path)
+    formula = load_qdimacs(qdimacs_path)
+    Xvar = formula.Xvar.tolist()
+    Yvar = formula.Yvar.tolist()
     verilog_formula = _convert_verilog(qdimacs_path)
 
     skolem_module, has_out = _skolem_module_info(skolem_path)
@@ -229,9 +232,6 @@ def check_skolem(qdimacs_path, skolem_path):
 
     error_content = _build_error_formula(Xvar, Yvar, verilog_formula, wrapper_name)
 
-    with open(skolem_path, "r") as f:
-        skolem_content = f.read()
-
     abc_cex = _static_bin_path("file_generation_cex")
     with tempfile.TemporaryDirectory(prefix="manthan_skolem_check_") as tmpdir:
         errorformula = os.path.join(tmpdir, "errorformula.v")
@@ -239,7 +239,8 @@ def check_skolem(qdimacs_path, skolem_path):
 
         with open(errorformula, "w") as f:
             f.write(error_content)
-            f.write(skolem_content)
+            with open(skolem_path, "r") as fskolem:
+                shutil.copyfileobj(fskolem, f)
             if wrapper_content:
                 f.write("\n" + wrapper_content)
 
@@ -266,7 +267,8 @@ def check_skolem(qdimacs_path, skolem_path):
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--qdimacs", required=True, help="Input QDIMACS file")
+    parser.add_argument("--qdimacs", required=True,
+                        help="Input QDIMACS file (optionally .gz/.xz/.bz2 compressed)")
     parser.add_argument("--skolem", required=True, help="Skolem Verilog file")
     args = parser.parse_args()
 
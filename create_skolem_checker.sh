@@ -75,10 +75,7 @@ do
 
         # create dir
         add_todo "mkdir -p ${outputdir}/${fin_out_dir}"
-        add_todo "cp ${SPEC_DIR}/${filename} ."
-        if [[ "${filename}" == *.gz ]]; then
-            add_todo "gunzip ${filename}"
-        fi
+        # checkSkolem.py reads .qdimacs.gz directly; no scratch copy needed
         baseout="${fin_out_dir}/${filename}"
 
         # run
@@ -86,7 +83,7 @@ do
         add_todo "skolem_path=\"${SKOLEM_DIR}/${filename}_skolem.v.xz\""
         add_todo "skolem_fallback=\"${SKOLEM_DIR}/${fin_out_dir}/${filenameunzipped%.qdimacs}_skolem.v\""
         add_todo "if [[ -f \"${skolem_path}\" ]]; then xz -d -c \"${skolem_path}\" > \"${filenameunzipped%.qdimacs}_skolem.v\"; skolem_use=\"${filenameunzipped%.qdimacs}_skolem.v\"; elif [[ -f \"${skolem_fallback}\" ]]; then skolem_use=\"${skolem_fallback}\"; else echo \"Missing skolem for ${filename}\"; exit 1; fi"
-        add_todo "/usr/bin/time --verbose -o ${baseout}.timeout_manthan ./doalarm -t real ${tlimit} ${opts} --qdimacs ${filenameunzipped} --skolem \"${skolem_use}\" > ${baseout}.out_manthan 2>&1"
+        add_todo "/usr/bin/time --verbose -o ${baseout}.timeout_manthan ./doalarm -t real ${tlimit} ${opts} --qdimacs ${SPEC_DIR}/${filename} --skolem \"${skolem_use}\" > ${baseout}.out_manthan 2>&1"
 
         #copy back result
 	add_todo "xz ${baseout}.out* 2>/dev/null || true"
@@ -99,8 +96,6 @@ do
 	
         add_todo "rm -f ${baseout}*"
         add_todo "rm -f ${filenameunzipped%.qdimacs}_skolem.v"
-        add_todo "rm -f ${filenameunzipped}"
-        add_todo "rm -f ${filename}"
 
         if [[ $mylinesper -eq 0 ]]; then
             mylinesper=$lines_this
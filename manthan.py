@@ -56,6 +56,12 @@ import pydotplus
 from collections import OrderedDict
 
 
+from src.qdimacs import load_qdimacs, qdimacs_stem
+from src.cache import open_formula_cache, open_sample_cache
+from src.varindex import VarIndex
+from src.primalgraph import PrimalGraph
+from src.abc_session import open_abc_session
+from src.satverifier import SatVerifier
 from src.convert_verilog import convert_verilog
 from src.preprocess import *
 from src.callUnique import unique_function
@@ -68,30 +74,49 @@ from src.repair import *
 def manthan():
     cprint("c [manthan] parsing")
     start_time = time.time()
-    Xvar, Yvar, qdimacs_list = parse(args.input)
+    cache = open_formula_cache(args.cache_dir, args.input)
+    formula = cache.load_formula() if cache else None
+    if formula is None:
+        formula = load_qdimacs(args.input)
+        if cache:
+            cache.save_formula(formula)
+    elif args.verbose:
+        cprint("c [manthan] using cached formula", cache.path)
+    Xvar = formula.Xvar.tolist()
+    Yvar = formula.Yvar.tolist()
+    vindex = VarIndex(Xvar, Yvar)
 
     if args.verbose:
         cprint("c [manthan] count X variables", len(Xvar))
         cprint("c [manthan] count Y variables", len(Yvar))
 
-    input_name = Path(args.input).name
-    if input_name.endswith(".qdimacs"):
-        output_stem = input_name[:-8]
-    else:
-        output_stem = Path(input_name).stem
+    output_stem = qdimacs_stem(args.input)
     output_path = args.output or f"{output_stem}_skolem.v"
     temp_stem = re.sub(r"[^A-Za-z0-9_-]+", "_", output_stem).strip("_") or "manthan"
 
     cnffile_name = temp_path(temp_stem + ".cnf")
 
-    cnfcontent = convertcnf(args.input, cnffile_name)
+    cnfcontent = cache.load_text("formula.cnf") if cache else None
+    if cnfcontent is None:
+        cnfcontent = convertcnf(formula, cnffile_name)
+        if cache:
+            cache.save_text("formula.cnf", cnfcontent)
     cnfcontent = cnfcontent.strip("\n")+"\n"
 
     if args.preprocess == 1:
         cprint("c [manthan] preprocessing: finding unates (constant functions)")
         start_t = time.time()
-        if len(Yvar) < 20000:
-            PosUnate, NegUnate = preprocess(cnffile_name)
+        unates = cache.load_unates() if cache else None
+        if unates is not None:
+            PosUnate, NegUnate = unates
+        elif len(Yvar) < 20000:
+            if not os.path.isfile(cnffile_name):
+                with open(cnffile_name, "w") as f:
+                    f.write(cnfcontent)
+            PosUnate, NegUnate, complete = preprocess(cnffile_name)
+            # a timed-out run found nothing conclusive; do not cache that
+            if cache and complete:
+                cache.save_unates(PosUnate, NegUnate)
         else:
             cprint("c [manthan] too many Y variables, let us proceed with Unique extraction")
             PosUnate = []
@@ -106,26 +131,28 @@ def manthan():
 
         Unates = PosUnate + NegUnate
 
+        unate_formula = formula.with_units(PosUnate + [-1 * int(yvar) for yvar in NegUnate])
+
         for yvar in PosUnate:
-            qdimacs_list.append([yvar])
             cnfcontent += "%s 0\n" % (yvar)
 
         for yvar in NegUnate:
-            qdimacs_list.append([-1 * int(yvar)])
             cnfcontent += "-%s 0\n" % (yvar)
 
     else:
         Unates = []
         PosUnate = []
         NegUnate = []
+        unate_formula = formula
         cprint("c [manthan] preprocessing is disabled. To do preprocessing, please use --preprocess=1")
 
+    vindex.set_unates(PosUnate, NegUnate)
+
     if len(Unates) == len(Yvar):
         cprint("c [manthan] positive unates", PosUnate)
         cprint("c [manthan] negative unates", NegUnate)
         cprint("c [manthan] all Y variables are unates and have constant functions")
-        skolemfunction_preprocess(
-            Xvar, Yvar, PosUnate, NegUnate, [], '', temp_stem, output_path)
+        skolemfunction_preprocess(vindex, '', temp_stem, output_path)
         exit()
 
     dg = nx.DiGraph()  # dag to handle dependencies
@@ -134,7 +161,7 @@ def manthan():
         cprint("c [manthan] finding uniquely defined functions")
         start_t = time.time()
         UniqueVars, UniqueDef = unique_function(
-            qdimacs_list, Xvar, Yvar, dg, Unates)
+            unate_formula, vindex, dg)
         if args.verbose:
             cprint("c [manthan] count of uniquely defined variables", len(UniqueVars))
             if args.verbose >= 2:
@@ -144,24 +171,39 @@ def manthan():
         UniqueDef = ''
         cprint("c [manthan] finding unique function is disabled. To find unique functions please use --unique")
 
+    vindex.set_unique(UniqueVars)
+
     if len(Unates) + len(UniqueVars) == len(Yvar):
         cprint("c [manthan] all Y variables are either unate or unique")
         cprint("c [manthan] found functions for all Y variables")
-        if args.preprocess == 1:
-            skolemfunction_preprocess(
-                Xvar, Yvar, PosUnate, NegUnate, UniqueVars, UniqueDef, temp_stem, output_path)
-        else:
-            skolemfunction_preprocess(
-                Xvar, Yvar, [], [], UniqueVars, UniqueDef, temp_stem, output_path)
+        skolemfunction_preprocess(vindex, UniqueDef, temp_stem, output_path)
         exit()
 
     # we need verilog file for repairing the candidates, hence first let us convert the qdimacs to verilog
     cprint("c [manthan] parsing and converting to verilog")
-    verilogformula, dg, ng = convert_verilog(args.input, args.multiclass == 1, dg)
+    formula_path = cache.cached_file("formula.v") if cache else None
+    if formula_path is None:
+        formula_path = temp_path(temp_stem + "_formula.v")
+        with open(formula_path, "w") as f:
+            dg = convert_verilog(formula, dg, f)
+        if cache:
+            cache.save_file("formula.v", formula_path)
+    else:
+        dg.add_nodes_from(Yvar)
+
+    # Y-Y co-occurrence graph used to cluster Y variables (args.multiclass)
+    ng = None
+    if args.multiclass == 1:
+        ng = cache.load_graph(Yvar) if cache else None
+        if ng is None:
+            ng = PrimalGraph.from_formula(formula)
+            if cache:
+                cache.save_graph(ng)
 
     start_t = time.time()
 
     sampling_cnf = cnfcontent
+    sample_cache = open_sample_cache(args.cache_dir, args.sample_cache_mb)
     if not args.maxsamples:
         if len(Xvar) > 4000:
             num_samples = 1000
@@ -174,63 +216,103 @@ def manthan():
 
     if args.weighted:
         sampling_weights_y_1 = ''
-        sampling_weights_y_0 = ''
         for xvar in Xvar:
             sampling_cnf += "w %s 0.5\n" % (xvar)
         for yvar in Yvar:
-            if yvar in UniqueVars:
+            if vindex.is_unique(yvar):
                 sampling_cnf += "w %s 0.5\n" % (yvar)
                 continue
-            if (yvar in PosUnate) or (yvar in NegUnate):
+            if vindex.is_unate(yvar):
                 continue
 
             sampling_weights_y_1 += "w %s 0.9\n" % (yvar)
-            sampling_weights_y_0 += "w %s 0.1\n" % (yvar)
 
         if args.adaptivesample:
             weighted_sampling_cnf = computeBias(
-                Xvar, Yvar, sampling_cnf, sampling_weights_y_1, sampling_weights_y_0, temp_stem, Unates + UniqueVars, args)
+                vindex, sampling_cnf, temp_stem, args, sample_cache)
         else:
             weighted_sampling_cnf = sampling_cnf + sampling_weights_y_1
 
+        sampling_cnf = weighted_sampling_cnf
+        weighted = 1
         cprint("c [manthan] generating weighted samples")
-        samples = generatesample(
-            args, num_samples, weighted_sampling_cnf, temp_stem, 1)
     else:
+        weighted = 0
         cprint("c [manthan] generating uniform samples")
+
+    projection = sampleProjection(vindex, args)
+
+    if args.adaptivesamplesize:
+        # rounds of doubling sample counts from 1000, until every cluster
+        # converges or the cap (--maxsamples, else 4x the default) is reached
+        cap = args.maxsamples or 4 * num_samples
+        def draw(count, previous):
+            return generatesample(
+                args, count, sampling_cnf, temp_stem, weighted, sample_cache, previous, projection)
+        candidateSkf, dg, samples = learnCandidateRounds(
+            vindex, draw, 1000, cap, dg, ng, args)
+    else:
         samples = generatesample(
-            args, num_samples, sampling_cnf, temp_stem, 0)
+            args, num_samples, sampling_cnf, temp_stem, weighted, sample_cache, None, projection)
 
-    cprint("c [manthan] generated samples.. learning candidate functions")
-    start_t = time.time()
+        cprint("c [manthan] generated samples.. learning candidate functions")
+        start_t = time.time()
 
-    candidateSkf, dg = learnCandidate(
-        Xvar, Yvar, UniqueVars, PosUnate, NegUnate, samples, dg, ng, args)
+        candidateSkf, dg = learnCandidate(
+            vindex, samples, dg, ng, args)
 
-    missing = [y for y in Yvar if (y not in UniqueVars and y not in PosUnate and y not in NegUnate and y not in candidateSkf)]
+    missing = [y for y in Yvar if (not vindex.is_known(y) and y not in candidateSkf)]
     if missing:
         cprint("c [manthan] missing candidate functions for Y variables:", missing)
         raise RuntimeError("Missing candidate functions for some Y variables; see log for details.")
 
-    YvarOrder = np.array(list(nx.topological_sort(dg)))
+    YvarOrder = list(nx.topological_sort(dg))
 
     assert(len(Yvar) == len(YvarOrder))
-
-    createSkolem(candidateSkf, Xvar, Yvar, UniqueVars,
-                 UniqueDef, temp_stem)
-
-    error_content = createErrorFormula(Xvar, Yvar, UniqueVars, verilogformula)
+    vindex.set_order(YvarOrder)
+
+    circuit = createSkolem(candidateSkf, vindex, UniqueDef)
+
+    session = None
+    sat_verifier = None
+    if args.verifier == "sat":
+        errorhead = None
+        sat_verifier = SatVerifier(vindex, formula)
+    elif args.verifier in ("aiger", "session"):
+        errorhead = createErrorAiger(vindex, formula)
+        if args.verifier == "session":
+            session = open_abc_session(errorhead, os.path.dirname(temp_path(temp_stem)), args.verbose or 0)
+    else:
+        errorhead = createErrorFormula(vindex, formula_path, temp_stem)
 
     maxsatWt, maxsatcnf, cnfcontent = maxsatContent(
         cnfcontent, (len(Xvar)+len(Yvar)), (len(PosUnate)+len(NegUnate)))
 
     countRefine = 0
+    # counterexample neighbourhood samples appended to the training data of each repaired variable
+    cexdata = {var: [] for var in Yvar}
 
     start_t = time.time()
 
     while True:
-        addSkolem(error_content, temp_stem, debug_keep=args.debug_keep)
-        check, sigma, ret = verify(Xvar, Yvar, temp_stem, args.verbose or 0, args.debug_keep)
+        result = None
+        if sat_verifier is not None:
+            sat_verifier.update(circuit)
+            result = sat_verifier.verify()
+        elif session is not None:
+            result = session.verify(circuit, Xvar, Yvar)
+            if result is None:
+                cprint("c [manthan] abc session failed; falling back to one abc process per check")
+                session = None
+        if result is not None:
+            check, sigma, ret = result
+        elif args.verifier in ("aiger", "session"):
+            addSkolemAiger(errorhead, circuit, temp_stem, debug_keep=args.debug_keep)
+            check, sigma, ret = verifyAiger(
+                errorhead, Xvar, Yvar, temp_stem, args.verbose or 0, args.debug_keep)
+        else:
+            addSkolem(errorhead, circuit, temp_stem, debug_keep=args.debug_keep)
+            check, sigma, ret = verify(Xvar, Yvar, temp_stem, args.verbose or 0, args.debug_keep)
         if check == 0:
             cprint("c [manthan] error --- ABC network read fail")
             break
@@ -238,7 +320,7 @@ def manthan():
             cprint("c [manthan] verification check UNSAT")
             cprint("c [manthan] no more repair needed")
             cprint("c [manthan] number of repairs needed to converge", countRefine)
-            createSkolemfunction(temp_stem, Xvar, Yvar, output_path)
+            createSkolemfunction(circuit, output_path)
             break
         if ret == 1:
             countRefine += 1
@@ -251,7 +333,7 @@ def manthan():
                 cnfcontent, maxsatWt, maxsatcnf, sigma[0], Xvar)
 
             ind = callMaxsat(
-                maxsatcnfRepair, sigma[2], UniqueVars, Unates, Yvar, YvarOrder, temp_stem, args.weightedmaxsat)
+                maxsatcnfRepair, sigma[2], vindex, temp_stem, args.weightedmaxsat)
 
             assert(len(ind) > 0)
 
@@ -262,26 +344,47 @@ def manthan():
                 cprint("c [manthan] variables undergoing refinement", ind)
 
             lexflag, repairfunctions = repair(
-                repaircnf, ind, Xvar, Yvar, YvarOrder, UniqueVars, Unates, sigma, temp_stem, args, args.lexmaxsat == 1)
+                repaircnf, ind, vindex, sigma, temp_stem, args, args.lexmaxsat == 1)
 
             if lexflag:
                 cprint("c [manthan] calling rc2 to find another set of candidates to repair")
                 ind = callRC2(maxsatcnfRepair,
-                              sigma[2], UniqueVars, Unates, Yvar, YvarOrder, args)
+                              sigma[2], vindex, args)
                 if len(ind) == 0:
                     cprint("c [manthan] no candidates returned by rc2; stopping repair")
                     exit(1)
                 if args.verbose == 1:
                     cprint("c [manthan] number of candidates undergoing repair iterations", len(ind))
                 lexflag, repairfunctions = repair(
-                    repaircnf, ind, Xvar, Yvar, YvarOrder, UniqueVars, Unates, sigma, temp_stem, args, 0)
+                    repaircnf, ind, vindex, sigma, temp_stem, args, 0)
             updateSkolem(repairfunctions, countRefine,
-                         sigma[2], temp_stem, Yvar, args)
+                         sigma[2], circuit, vindex, args)
+
+            if args.cexsamples > 0:
+                try:
+                    extra = neighbourhoodSamples(
+                        args, sampling_cnf, sigma[0], Xvar, args.cexsamples, projection, countRefine)
+                except RuntimeError as exc:
+                    cprint("c [manthan] counterexample resampling failed:", exc)
+                    extra = None
+                if extra is not None:
+                    relearn = [yvar for yvar in ind if not vindex.is_known(yvar)]
+                    for yvar in relearn:
+                        cexdata[yvar].append(extra)
+                        circuit.relearn(yvar, relearnCandidate(vindex, samples, cexdata[yvar], yvar, dg, args))
+                    if args.verbose:
+                        cprint("c [manthan] relearned %s candidates with %s samples near the counterexample"
+                               % (len(relearn), len(extra)))
         if countRefine > args.maxrepairitr:
             cprint("c [manthan] number of maximum allowed repair iteration reached")
             cprint("c [manthan] could not synthesize functions")
             break
 
+    if session is not None:
+        session.close()
+    if sat_verifier is not None:
+        sat_verifier.close()
+
 
 if __name__ == "__main__":
 
@@ -299,10 +402,28 @@ if __name__ == "__main__":
                         help="self substitution threshold", dest='selfsubthres')
     parser.add_argument('--adaptivesample', type=int, default=1,
                         help="required --weighted to 1: to enable/disable adaptive weighted sampling ", dest='adaptivesample')
+    parser.add_argument('--bias-levels', default="0.9,0.1", dest='bias_levels',
+                        help="comma separated weights of the concurrent adaptive-bias probes; default 0.9,0.1")
+    parser.add_argument('--bias-rounds', type=int, default=1, dest='bias_rounds',
+                        help="maximum adaptive-bias rounds; later rounds re-probe until the weights stabilise; default 1")
     parser.add_argument('--showtrees', type=int, default=0,
                         help="To see the decision trees: 1; default 0", dest='showtrees')
     parser.add_argument('--maxsamples', type=int,
                         help="samples used to learn", dest='maxsamples')
+    parser.add_argument('--adaptivesamplesize', type=int, default=0,
+                        help="1: sample in doubling rounds and stop once the candidate of every cluster "
+                        "has converged on held-out samples (--maxsamples caps it); default 0", dest='adaptivesamplesize')
+    parser.add_argument('--knownfeatures', type=int, default=1,
+                        help="0: do not sample uniquely defined or unate Y variables, nor use them as "
+                        "features; default 1", dest='knownfeatures')
+    parser.add_argument('--sampletol', type=float, default=0.005,
+                        help="held-out accuracy tolerance for --adaptivesamplesize; default 0.005", dest='sampletol')
+    parser.add_argument('--cexsamples', type=int, default=0,
+                        help="after each repair, draw this many samples near the counterexample and relearn the "
+                        "repaired candidates with them (their repairs are kept); default 0 (off)", dest='cexsamples')
+    parser.add_argument('--cexfix', type=float, default=0.5,
+                        help="fraction of the counterexample's X literals fixed when resampling near it; "
+                        "default 0.5", dest='cexfix')
     parser.add_argument(
         "--preprocess",
         nargs="?",
@@ -321,6 +442,19 @@ if __name__ == "__main__":
         choices=[0, 1],
         help="enable multiclass: 1; disable: 0; default 1",
     )
+    parser.add_argument("--learner", choices=["sklearn", "bitset"], default="sklearn",
+                        help="decision tree learner: sklearn, or a gini tree fitted with popcounts over the packed "
+                        "samples (same splitting rule, --gini and --seed); default sklearn")
+    parser.add_argument(
+        "--multioutput",
+        nargs="?",
+        const=1,
+        default=0,
+        type=int,
+        choices=[0, 1],
+        help="with multiclass, learn each cluster as one multi-output tree (a 0/1 output per variable) "
+        "instead of one class per label combination: 1; default 0",
+    )
     parser.add_argument("--weightedmaxsat", action='store_true')
     parser.add_argument(
         "--lexmaxsat",
@@ -346,11 +480,28 @@ if __name__ == "__main__":
     parser.add_argument("--itp-limit", type=int, default=1000,
                         help="interpolating solver conflict limit; -1 for no limit", dest='itp_limit')
     parser.add_argument("-o", "--output", help="output skolem verilog path")
+    parser.add_argument("--verifier", choices=["verilog", "aiger", "session", "sat"], default="verilog",
+                        help="how each repair iteration is checked: Verilog error formula (file_generation_cex), "
+                        "binary AIGER (abc), a persistent in-process abc session (libabc) that keeps the "
+                        "formula loaded, or an incremental in-process SAT solver (pysat); default verilog")
+    parser.add_argument("--sampling-workers", type=int, default=1, dest="sampling_workers",
+                        help="number of concurrent cmsgen processes, each with its own derived seed; default 1")
+    parser.add_argument("--learn-workers", type=int, default=1, dest="learn_workers",
+                        help="number of processes fitting cluster trees in parallel; the candidates are the same "
+                        "as with one; default 1")
     parser.add_argument("--sample-mem-frac", type=float, default=0.7,
                         help="fraction of available memory to use for sample parsing (0 disables cap)")
+    parser.add_argument("--out-of-core", action="store_true", dest="out_of_core",
+                        help="keep samples beyond the --sample-mem-frac budget in memory-mapped files in the run's "
+                        "temp dir instead of truncating them")
+    parser.add_argument("--cache-dir", dest="cache_dir",
+                        help="directory for caching parsed formulas and seed-independent artefacts across runs")
+    parser.add_argument("--sample-cache-mb", type=float, default=2048, dest="sample_cache_mb",
+                        help="size budget of the sample cache under --cache-dir, least recently used "
+                        "entries are evicted first (0 disables it); default 2048")
     parser.add_argument("--debug-keep", action="store_true",
                         help="keep generated temp files for debugging")
-    parser.add_argument("input", help="input file")
+    parser.add_argument("input", help="input file (.qdimacs, optionally .gz/.xz/.bz2 compressed)")
     args = parser.parse_args()
     try:
         import src.InterpolatingSolver as InterpolatingSolver
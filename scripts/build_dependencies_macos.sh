@@ -159,7 +159,11 @@ echo "c building abc helpers"
     "$ABC_CXX" -g -o file_generation_cnf file_generation_cnf.o libabc.a -lm -ldl -lreadline -lpthread
     "$ABC_CC" -Wall -g $ABC_CFLAGS -c file_write_verilog.c -o file_write_verilog.o
     "$ABC_CXX" -g -o file_write_verilog file_write_verilog.o libabc.a -lm -ldl -lreadline -lpthread
-    cp file_generation_cex file_generation_cnf file_write_verilog "$STATIC_DIR/"
+    CC="$ABC_CC" CXX="$ABC_CXX" CXXFLAGS="$ABC_CXXFLAGS" CFLAGS="$ABC_CFLAGS" make abc
+    cp file_generation_cex file_generation_cnf file_write_verilog abc "$STATIC_DIR/"
+    # shared library for the in-process abc session (--verifier session)
+    CC="$ABC_CC" CXX="$ABC_CXX" CXXFLAGS="$ABC_CXXFLAGS" CFLAGS="$ABC_CFLAGS" make ABC_USE_PIC=1 libabc.so \
+      && cp libabc.so "$STATIC_DIR/" || echo "c could not build libabc.so; --verifier session will fall back to abc"
   else
     echo "c missing abc helper sources (file_generation_*.c not found)"
     exit 1
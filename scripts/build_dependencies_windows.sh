@@ -96,6 +96,8 @@ echo "c building abc helpers"
     copy_bin file_generation_cex
     copy_bin file_generation_cnf
     copy_bin file_write_verilog
+    CC="$ABC_CC" CXX="$ABC_CXX" CXXFLAGS="$ABC_CXXFLAGS" CFLAGS="$ABC_CFLAGS" make abc
+    copy_bin abc
   else
     echo "c skipping abc helpers (file_generation_*.c not found)"
   fi
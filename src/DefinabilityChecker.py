@@ -13,8 +13,10 @@ import src.Utils as Utils
 class DefinabilityChecker:
   
   def __init__(self, formula, existentials):
-    self.max_variable = Utils.maxVarIndex(formula)
-    variables = {abs(l) for clause in formula for l in clause}
+    # 'formula' is a QdimacsFormula; the solvers still want clause lists.
+    self.max_variable = formula.max_var()
+    variables = set(formula.variables().tolist())
+    formula = formula.clause_list()
     self.renaming = {v: v + self.max_variable for v in variables}
     # Create copy of 'formula' for second part.
     formula_copy = Utils.renameFormula(formula, self.renaming)
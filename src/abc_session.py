@@ -0,0 +1,126 @@
+import contextlib
+import ctypes
+import os
+import sys
+
+import numpy as np
+
+from src.aig import parse_cex
+from src.logging_utils import cprint
+
+
+_LIB_NAMES = ("libabc.so", "libabc.dylib")
+
+
+def _libabc_path():
+    for directory in ("./dependencies/static_bin", "./dependencies/abc"):
+        for name in _LIB_NAMES:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return os.path.abspath(path)
+    return None
+
+
+@contextlib.contextmanager
+def _redirect_stdout(enabled):
+    # ABC prints through C stdio; silence it at the file descriptor level
+    if not enabled:
+        yield
+        return
+    libc = ctypes.CDLL(None)
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, 1)
+        yield
+    finally:
+        libc.fflush(None)
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+class AbcSession:
+    """ABC frame kept alive in-process (through libabc) across repair iterations.
+
+    The formula part of the error miter is read once and backed up; each
+    check restores it, appends only the current Skolem cone (inputs are
+    matched by name), ANDs the outputs and runs sat, whose verdict is read
+    from the frame. Nothing is re-parsed except the cone and no process is
+    started per iteration.
+    """
+
+    def __init__(self, lib, miter, workdir, verbose=0):
+        self.lib = lib
+        self.miter = miter
+        self.verbose = verbose
+        self.base = os.path.join(workdir, "errorformula_base.aig")
+        self.cone = os.path.join(workdir, "skolem_cone.aig")
+        self.cexfile = os.path.join(workdir, "session_cex.txt")
+
+        lib.Abc_Start()
+        lib.Abc_FrameGetGlobalFrame.restype = ctypes.c_void_p
+        lib.Cmd_CommandExecute.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        lib.Cmd_CommandExecute.restype = ctypes.c_int
+        lib.Abc_FrameReadProbStatus.argtypes = [ctypes.c_void_p]
+        lib.Abc_FrameReadProbStatus.restype = ctypes.c_int
+        self.frame = lib.Abc_FrameGetGlobalFrame()
+
+        miter.write_base(self.base)
+        if not self.execute("read_aiger %s; backup" % (self.base)):
+            raise RuntimeError("could not load the error formula into abc")
+
+    def execute(self, script):
+        for command in script.split(";"):
+            with _redirect_stdout(self.verbose < 2):
+                status = self.lib.Cmd_CommandExecute(self.frame, command.strip().encode())
+            if status != 0:
+                cprint("c [AbcSession] abc command failed:", command.strip())
+                return False
+        return True
+
+    def verify(self, circuit, Xvar, Yvar):
+        """Same contract as verify(); None if the session can not be used."""
+        self.miter.add_skolem(circuit)
+        self.miter.write_skolem_cone(self.cone)
+        if os.path.exists(self.cexfile):
+            os.unlink(self.cexfile)
+        script = "restore; backup; append %s; andpos; sat" % (self.cone)
+        if not self.execute(script):
+            return None
+        # 1: UNSAT, the Skolem function is valid; 0: SAT; -1: undecided
+        status = self.lib.Abc_FrameReadProbStatus(self.frame)
+        if status == 1:
+            return (1, [], 0)
+        if status != 0:
+            cprint("c [AbcSession] abc sat was undecided")
+            return None
+        if not self.execute("write_cex -n %s" % (self.cexfile)) or not os.path.isfile(self.cexfile):
+            return None
+        with open(self.cexfile, "r") as f:
+            model = f.read().strip(" \n")
+        if not model:
+            cprint("c [AbcSession] abc reported SAT without a counterexample")
+            return None
+        cex = parse_cex(model, self.miter.names)
+        if cex is None:
+            cprint("c [AbcSession] could not parse abc counterexample")
+            return None
+        modelx, modely, modelyp = np.split(np.array(cex), [len(Xvar), len(Xvar) + len(Yvar)])
+        return (1, [modelx, modely, modelyp], 1)
+
+    def close(self):
+        self.lib.Abc_Stop()
+
+
+def open_abc_session(miter, workdir, verbose=0):
+    path = _libabc_path()
+    if path is None:
+        cprint("c [AbcSession] libabc not found; falling back to one abc process per check")
+        return None
+    try:
+        return AbcSession(ctypes.CDLL(path), miter, workdir, verbose)
+    except (OSError, AttributeError, RuntimeError) as exc:
+        cprint("c [AbcSession] could not start abc session:", exc)
+        return None
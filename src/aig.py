@@ -0,0 +1,363 @@
+import re
+
+import numpy as np
+
+
+FALSE = 0
+TRUE = 1
+
+
+class AIG:
+    """Structurally hashed and-inverter graph with AIGER literal encoding.
+
+    Inputs are literals 2, 4, ..., 2*num_inputs; and-gates are appended in
+    topological order, so the graph can be written as binary AIGER as is.
+    """
+
+    def __init__(self, num_inputs):
+        self.num_inputs = num_inputs
+        self.ands = []
+        self.strash = {}
+        self.frozen = 0
+        self.frozen_bytes = b""
+
+    def input(self, i):
+        return 2 * (i + 1)
+
+    def and_(self, a, b):
+        if a < b:
+            a, b = b, a
+        if b == FALSE:
+            return FALSE
+        if b == TRUE or a == b:
+            return a
+        if a == b ^ 1:
+            return FALSE
+        lit = self.strash.get((a, b))
+        if lit is None:
+            lit = 2 * (self.num_inputs + 1 + len(self.ands))
+            self.ands.append((a, b))
+            self.strash[(a, b)] = lit
+        return lit
+
+    def or_(self, a, b):
+        return self.and_(a ^ 1, b ^ 1) ^ 1
+
+    def xor(self, a, b):
+        return self.or_(self.and_(a, b ^ 1), self.and_(a ^ 1, b))
+
+    def xnor(self, a, b):
+        return self.xor(a, b) ^ 1
+
+    def and_many(self, lits):
+        # balanced reduction keeps the depth logarithmic
+        lits = list(lits)
+        if not lits:
+            return TRUE
+        while len(lits) > 1:
+            paired = [self.and_(lits[i], lits[i + 1]) for i in range(0, len(lits) - 1, 2)]
+            if len(lits) % 2:
+                paired.append(lits[-1])
+            lits = paired
+        return lits[0]
+
+    def or_many(self, lits):
+        return self.and_many([lit ^ 1 for lit in lits]) ^ 1
+
+    def checkpoint(self):
+        return len(self.ands)
+
+    def rollback(self, mark):
+        # drops every gate created after checkpoint()
+        assert mark >= self.frozen
+        for key in self.ands[mark:]:
+            del self.strash[key]
+        del self.ands[mark:]
+
+    def is_gate(self, lit):
+        return (lit >> 1) > self.num_inputs
+
+    def gate(self, lit):
+        return self.ands[(lit >> 1) - self.num_inputs - 1]
+
+    def cone(self, lits):
+        # gate variables in the transitive fan-in of lits, in topological order
+        first = self.num_inputs + 1
+        seen = set()
+        stack = [lit >> 1 for lit in lits]
+        while stack:
+            var = stack.pop()
+            if var < first or var in seen:
+                continue
+            seen.add(var)
+            a, b = self.ands[var - first]
+            stack.append(a >> 1)
+            stack.append(b >> 1)
+        return sorted(seen)
+
+    def extract(self, outputs):
+        """Copy of the transitive fan-in of `outputs` as a new AIG with the
+        same inputs; returns it together with the remapped outputs."""
+        first = self.num_inputs + 1
+        seen = self.cone(outputs)
+        cone = AIG(self.num_inputs)
+        remap = {}
+
+        def lit_of(lit):
+            var = lit >> 1
+            if var < first:
+                return lit
+            return remap[var] ^ (lit & 1)
+
+        for var in seen:
+            a, b = self.ands[var - first]
+            remap[var] = cone.and_(lit_of(a), lit_of(b))
+        return cone, [lit_of(lit) for lit in outputs]
+
+    def freeze(self):
+        # the gates so far are encoded once and reused by every write()
+        self.frozen_bytes += self._encode(self.frozen, len(self.ands))
+        self.frozen = len(self.ands)
+
+    def _encode(self, start, end):
+        if start >= end:
+            return b""
+        rhs = np.asarray(self.ands[start:end], dtype=np.uint64).reshape(-1, 2)
+        lhs = 2 * (self.num_inputs + 1 + np.arange(start, end, dtype=np.uint64))
+        deltas = np.empty(2 * rhs.shape[0], dtype=np.uint64)
+        deltas[0::2] = lhs - rhs[:, 0]
+        deltas[1::2] = rhs[:, 0] - rhs[:, 1]
+        return _encode_varints(deltas)
+
+    def write(self, path, outputs, names=None, output_names=None):
+        num_ands = len(self.ands)
+        header = "aig %d %d 0 %d %d\n" % (self.num_inputs + num_ands, self.num_inputs,
+                                          len(outputs), num_ands)
+        header += "".join("%d\n" % (lit) for lit in outputs)
+        with open(path, "wb") as f:
+            f.write(header.encode())
+            f.write(self.frozen_bytes)
+            f.write(self._encode(self.frozen, num_ands))
+            if names is not None:
+                f.write(names)
+            if output_names is not None:
+                f.write("".join("o%d %s\n" % (i, name) for i, name in enumerate(output_names)).encode())
+
+
+def _encode_varints(values):
+    # AIGER 7-bit little-endian varints, encoded for the whole array at once
+    groups = np.empty((values.size, 10), dtype=np.uint8)
+    nbytes = np.ones(values.size, dtype=np.int64)
+    for k in range(10):
+        groups[:, k] = (values >> np.uint64(7 * k)) & np.uint64(0x7f)
+        if k:
+            nbytes += (values >> np.uint64(7 * k)) > 0
+    pos = np.arange(10)
+    groups |= ((pos[None, :] < (nbytes[:, None] - 1)) * 0x80).astype(np.uint8)
+    return groups[pos[None, :] < nbytes[:, None]].tobytes()
+
+
+def parse_cex(model, names):
+    # abc's write_cex prints either "name=value" pairs or a plain bit
+    # string with the values in input order
+    tokens = model.split()
+    if tokens and all("=" in tok for tok in tokens):
+        values = dict(tok.split("=", 1) for tok in tokens)
+        if any(name not in values for name in names):
+            return None
+        return [int(values[name]) for name in names]
+    bits = "".join(tokens)
+    if len(bits) < len(names) or any(ch not in "01" for ch in bits):
+        return None
+    return [int(ch) for ch in bits[:len(names)]]
+
+
+def symbol_table(names):
+    return "".join("i%d %s\n" % (i, name) for i, name in enumerate(names)).encode()
+
+
+def formula_aig(aig, formula, lits):
+    # AND over clauses of the OR of their literals; lits[v] is the AIG
+    # literal of variable v
+    literals = formula.literals
+    mapped = lits[np.abs(literals)] ^ (literals < 0).astype(lits.dtype)
+    mapped = mapped.tolist()
+    offsets = formula.offsets.tolist()
+    clauses = [aig.or_many(mapped[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+    return aig.and_many(clauses)
+
+
+_TOKEN = re.compile(r"1'b[01]|[A-Za-z_][A-Za-z0-9_]*|\d+|[~!&|^()]")
+_ASSIGN = re.compile(r"assign\s+([A-Za-z_][A-Za-z0-9_]*)\s*=\s*([^;]*);")
+_BINARY = {"|": 1, "^": 2, "&": 3}
+
+
+def verilog_assigns(text, module=None):
+    """Right-hand-side token lists of every assign in `module` (or in the
+    whole text), keyed by lhs."""
+    body = text
+    if module is not None:
+        start = re.search(r"module\s+%s\b" % (module), text)
+        if start is None:
+            raise RuntimeError("module %s not found" % (module))
+        end = text.find("endmodule", start.end())
+        body = text[start.end():end if end >= 0 else len(text)]
+    return {lhs: _TOKEN.findall(expr) for lhs, expr in _ASSIGN.findall(body)}
+
+
+def eval_expression(aig, expr, env):
+    return _eval_tokens(aig, _TOKEN.findall(expr), env)
+
+
+def _eval_tokens(aig, tokens, env):
+    # shunting-yard evaluation; iterative, so deeply nested repairs are fine
+    values = []
+    ops = []
+
+    def apply(op):
+        if op == "~":
+            values.append(values.pop() ^ 1)
+            return
+        b = values.pop()
+        a = values.pop()
+        if op == "&":
+            values.append(aig.and_(a, b))
+        elif op == "|":
+            values.append(aig.or_(a, b))
+        else:
+            values.append(aig.xor(a, b))
+
+    for tok in tokens:
+        if tok in ("~", "!"):
+            ops.append("~")
+        elif tok == "(":
+            ops.append(tok)
+        elif tok == ")":
+            while ops[-1] != "(":
+                apply(ops.pop())
+            ops.pop()
+            while ops and ops[-1] == "~":
+                apply(ops.pop())
+        elif tok in _BINARY:
+            while ops and ops[-1] != "(" and (ops[-1] == "~" or _BINARY[ops[-1]] >= _BINARY[tok]):
+                apply(ops.pop())
+            ops.append(tok)
+        else:
+            if tok in ("0", "1'b0"):
+                values.append(FALSE)
+            elif tok in ("1", "1'b1"):
+                values.append(TRUE)
+            else:
+                values.append(env[tok])
+            while ops and ops[-1] == "~":
+                apply(ops.pop())
+    while ops:
+        apply(ops.pop())
+    if len(values) != 1:
+        raise RuntimeError("malformed expression: %s" % (" ".join(tokens)))
+    return values[0]
+
+
+def assigns_aig(aig, assigns, env, roots):
+    """Builds the wires in `roots` (and the wires they depend on) from the
+    parsed assigns; env maps input names to literals and is extended with
+    every wire built."""
+    order = []
+    state = {}
+    for root in roots:
+        if root in env or root in state:
+            continue
+        stack = [root]
+        while stack:
+            name = stack[-1]
+            if state.get(name) == 2:
+                stack.pop()
+                continue
+            if name not in assigns:
+                raise RuntimeError("undriven wire %s" % (name))
+            state[name] = 1
+            pending = [tok for tok in assigns[name]
+                       if tok in assigns and tok not in env and state.get(tok) != 2]
+            if any(state.get(tok) == 1 for tok in pending):
+                raise RuntimeError("combinational loop through %s" % (name))
+            if pending:
+                stack.extend(pending)
+                continue
+            state[name] = 2
+            order.append(name)
+            stack.pop()
+    for name in order:
+        env[name] = _eval_tokens(aig, assigns[name], env)
+    return [env[root] for root in roots]
+
+
+class ErrorMiter:
+    """AIG of the error formula F(X, Y) & (W == Y') & ~F(X, Y').
+
+    Inputs are X, Y and ip<y> in that order, matching the MAIN module of
+    the Verilog error formula; Y' is Y for uniquely defined variables and
+    ip<y> otherwise. They are followed by one input per w<y> wire of the
+    Skolem circuit, tied to its function by an equality in the output.
+    Both copies of F are built once; add_skolem() copies the gates the
+    Skolem circuit gained since the last call and rebuilds the output.
+    """
+
+    def __init__(self, vindex, formula):
+        Xvar = vindex.Xvar
+        Yvar = vindex.Yvar
+        num_x = len(Xvar)
+        num_y = len(Yvar)
+        self.Yvar = Yvar
+        self.aig = AIG(num_x + 3 * num_y)
+        size = max([formula.max_var()] + Xvar + Yvar) + 1
+        lits = np.zeros(size, dtype=np.int64)
+        lits[Xvar] = 2 * (1 + np.arange(num_x))
+        lits[Yvar] = 2 * (1 + num_x + np.arange(num_y))
+        mixed = lits.copy()
+        for i, var in enumerate(Yvar):
+            if not vindex.is_unique(var):
+                mixed[var] = 2 * (1 + num_x + num_y + i)
+        self.mixed = [int(mixed[var]) for var in Yvar]
+        self.wires = [2 * (1 + num_x + 2 * num_y + i) for i in range(num_y)]
+        # circuit variable -> miter literal, in SkolemCircuit input order (i, o, w)
+        self.remap = [FALSE] + [int(lits[var]) for var in Xvar] + self.mixed + self.wires
+
+        self.f1 = formula_aig(self.aig, formula, lits)
+        self.f3 = formula_aig(self.aig, formula, mixed)
+        self.names = ["%s" % (var) for var in Xvar + Yvar] + ["ip%s" % (var) for var in Yvar]
+        self.symbols = symbol_table(self.names + ["w%s" % (var) for var in Yvar])
+        self.aig.freeze()
+        self.equal = None
+        self.out = None
+
+    def _map(self, lit):
+        return self.remap[lit >> 1] ^ (lit & 1)
+
+    def add_skolem(self, circuit):
+        self.aig.rollback(self.aig.frozen)
+        for a, b in circuit.aig.ands[len(self.remap) - circuit.aig.num_inputs - 1:]:
+            self.remap.append(self.aig.and_(self._map(a), self._map(b)))
+        self.aig.freeze()
+        terms = []
+        for var, o, w in zip(self.Yvar, self.mixed, self.wires):
+            func = self._map(circuit.func[var])
+            terms.append(self.aig.xnor(func, o))
+            terms.append(self.aig.xnor(func, w))
+        self.equal = self.aig.and_many(terms)
+        self.out = self.aig.and_many([self.f1, self.equal, self.f3 ^ 1])
+        return self.out
+
+    def write(self, path):
+        self.aig.write(path, [self.out], self.symbols, ["out"])
+
+    def write_base(self, path):
+        # formula part only: outputs F(X, Y) and ~F(X, Y')
+        self.aig.rollback(self.aig.frozen)
+        self.equal = None
+        self.out = None
+        self.aig.write(path, [self.f1, self.f3 ^ 1], self.symbols, ["f1", "nf3"])
+
+    def write_skolem_cone(self, path):
+        # the W == Y' cone of the last add_skolem(), over the same inputs
+        cone, outputs = self.aig.extract([self.equal])
+        cone.write(path, outputs, self.symbols, ["equal"])
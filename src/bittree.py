@@ -0,0 +1,166 @@
+import numpy as np
+
+from src.samplematrix import popcount
+
+
+_EPSILON = np.finfo(np.float64).eps
+
+# elements of the (features, classes, words) block scored at once
+_BLOCK = 1 << 22
+
+
+class _Tree:
+    """The arrays of a fitted tree, laid out like sklearn's tree_."""
+
+    def __init__(self, left, right, feature, value):
+        self.children_left = np.asarray(left, dtype=np.int64)
+        self.children_right = np.asarray(right, dtype=np.int64)
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.node_count = len(self.feature)
+        self.n_outputs = self.value.shape[1]
+
+
+class BitTreeClassifier:
+    """Gini decision tree for Boolean features over bit-packed columns.
+
+    Feature j is row j of a uint64 matrix: bit r % 64 of word r // 64 is
+    sample r, as in SampleMatrix. A node is a mask of its samples over
+    the words where it has any. Every class of every output is such a
+    mask too, so the class counts on the 1-side of each candidate split
+    are popcounts of (feature & node & class). No dense or float copy of
+    the features is made: they are read from `words` a bounded block at a
+    time, so `words` may be a memory-mapped file larger than memory.
+
+    Splits are chosen like sklearn's DecisionTreeClassifier (gini, all
+    features, best split): the impurity of several outputs is their mean,
+    a node is split on the feature with the largest weighted impurity
+    decrease if that is at least min_impurity_decrease, and ties go to
+    the first feature in an order drawn from random_state. fit() leaves
+    classes_, n_outputs_ and a tree_ with sklearn's arrays (value holds
+    class counts); children are numbered after their parent.
+    """
+
+    def __init__(self, min_impurity_decrease=0.0, random_state=None):
+        self.min_impurity_decrease = min_impurity_decrease
+        self.random_state = random_state
+
+    def fit(self, words, labels, features=None):
+        """words: (rows, W) uint64 packed columns; labels: one row of class
+        labels (one per output) per sample. Feature j is row features[j] of
+        words (default: row j), so a selection of columns is not copied."""
+        labels = np.asarray(labels).reshape(len(labels), -1)
+        num_samples, outputs = labels.shape
+        nwords = (num_samples + 63) // 64
+        self._words = words
+        self._features = np.arange(len(words)) if features is None else np.asarray(features, dtype=np.int64)
+
+        classes = [np.unique(labels[:, j]) for j in range(outputs)]
+        masks = []
+        for j, values in enumerate(classes):
+            for value in values:
+                bits = np.packbits(labels[:, j] == value, bitorder="little")
+                masks.append(np.pad(bits, (0, 8 * nwords - len(bits))).view(np.uint64))
+        self._masks = np.array(masks, dtype=np.uint64).reshape(len(masks), nwords)
+        self._starts = np.cumsum([0] + [len(values) for values in classes])[:-1]
+        self._output = np.repeat(np.arange(outputs), [len(values) for values in classes])
+        self._total = num_samples
+        self._rng = np.random.default_rng(self.random_state)
+
+        width = max(len(values) for values in classes)
+        left, right, feature, value = [-1], [-1], [-2], [None]
+        full = np.full(nwords, np.uint64(0xFFFFFFFFFFFFFFFF))
+        if num_samples % 64:
+            full[-1] = np.uint64((1 << (num_samples % 64)) - 1)
+        stack = [(0, np.arange(nwords), full)]
+        while stack:
+            node, index, mask = stack.pop()
+            counts = popcount(self._masks[:, index] & mask)
+            value[node] = np.zeros((outputs, width))
+            for j, start in enumerate(self._starts):
+                value[node][j, :len(classes[j])] = counts[start:start + len(classes[j])]
+            split = self._split(index, mask, self._masks[:, index] & mask, counts)
+            if split is None:
+                continue
+            column = words[self._features[split], index]
+            children = []
+            for side in (mask & ~column, mask & column):
+                keep = side != 0
+                children.append((len(feature), index[keep], side[keep]))
+                left.append(-1)
+                right.append(-1)
+                feature.append(-2)
+                value.append(None)
+            left[node] = children[0][0]
+            right[node] = children[1][0]
+            feature[node] = split
+            stack.extend(reversed(children))
+
+        del self._words
+        self.tree_ = _Tree(left, right, feature, value)
+        self.n_outputs_ = outputs
+        self.classes_ = classes[0] if outputs == 1 else classes
+        return self
+
+    @staticmethod
+    def _impurity(counts, n, starts):
+        # mean gini over the outputs; counts (..., classes) grouped by output at starts
+        share = counts / np.maximum(n, 1)[..., None]
+        sums = np.add.reduceat(share * share, starts, axis=-1)
+        return 1.0 - sums.mean(axis=-1)
+
+    def _split(self, index, mask, classmasks, counts):
+        # best feature to split the node (mask over the words at index) on,
+        # or None if it stays a leaf. Only the classes present in the node
+        # are counted, and the last of each output follows from the others
+        present = np.flatnonzero(counts)
+        output = self._output[present]
+        first = np.flatnonzero(np.r_[True, output[1:] != output[:-1]])
+        last = np.r_[first[1:], len(present)] - 1
+        scored = np.setdiff1d(np.arange(len(present)), last)
+        group = np.zeros((len(scored), len(first)))
+        group[np.arange(len(scored)), output[scored] - output[0]] = 1
+        counts = counts[present]
+        classmasks = classmasks[present[scored]]
+
+        n = counts[first[0]:last[0] + 1].sum()
+        impurity = self._impurity(counts, np.asarray(n), first)
+        if n < 2 or impurity <= _EPSILON:
+            return None
+        order = self._rng.permutation(len(self._features))
+        step = max(1, _BLOCK // max(classmasks.size, len(index), 1))
+        best, best_gain = None, -np.inf
+        for start in range(0, len(order), step):
+            block = order[start:start + step]
+            ones = self._words[np.ix_(self._features[block], index)] & mask
+            n_one = popcount(ones)
+            c_one = np.empty((len(block), len(present)))
+            c_one[:, scored] = popcount(ones[:, None, :] & classmasks[None, :, :])
+            c_one[:, last] = n_one[:, None] - c_one[:, scored] @ group
+            n_zero = n - n_one
+            gain = (impurity - (n_one * self._impurity(c_one, n_one, first)
+                                + n_zero * self._impurity(counts - c_one, n_zero, first)) / n) * (n / self._total)
+            gain[(n_one == 0) | (n_zero == 0)] = -np.inf
+            k = int(np.argmax(gain))
+            if gain[k] > best_gain:
+                best, best_gain = int(block[k]), gain[k]
+        if best is None or best_gain + _EPSILON < self.min_impurity_decrease:
+            return None
+        return best
+
+    def predict(self, X):
+        """Labels of the rows of a dense (samples, features) 0/1 matrix."""
+        X = np.asarray(X)
+        t = self.tree_
+        node = np.zeros(len(X), dtype=np.int64)
+        rows = np.arange(len(X))
+        while rows.size:
+            inner = t.children_left[node[rows]] != -1
+            rows = rows[inner]
+            at = node[rows]
+            one = X[rows, t.feature[at]] > 0.5
+            node[rows] = np.where(one, t.children_right[at], t.children_left[at])
+        classes = [self.classes_] if self.n_outputs_ == 1 else self.classes_
+        labels = np.column_stack([np.asarray(c)[np.argmax(t.value[node, j, :len(c)], axis=1)]
+                                  for j, c in enumerate(classes)])
+        return labels[:, 0] if self.n_outputs_ == 1 else labels
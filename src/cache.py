@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from src.logging_utils import cprint
+from src.primalgraph import PrimalGraph
+from src.qdimacs import QdimacsFormula
+from src.samplematrix import SampleMatrix
+
+# bump when the on-disk layout of an entry changes
+_FORMULA_CACHE_VERSION = "v2"
+_SAMPLE_CACHE_VERSION = "v1"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_write(path, write):
+    # write(fileobj) goes to a temp file in the same directory which is then
+    # renamed into place, so concurrent runs never see a partial entry.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _save_array(path, array):
+    _atomic_write(path, lambda f: np.save(f, np.ascontiguousarray(array)))
+
+
+def _load_array(path):
+    if not os.path.isfile(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+class FormulaCache:
+    """Seed-independent artefacts of one input file, keyed by its sha256.
+
+    Arrays are stored as .npy files and opened memory-mapped; text artefacts
+    (CNF, FORMULA Verilog) are stored as plain files.
+    """
+
+    def __init__(self, cache_dir, inputfile):
+        self.key = file_digest(inputfile)
+        self.path = os.path.join(cache_dir, "formula", _FORMULA_CACHE_VERSION, self.key)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def load_formula(self):
+        meta_path = self._file("formula.json")
+        if not os.path.isfile(meta_path):
+            return None
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        arrays = [_load_array(self._file(name + ".npy"))
+                  for name in ("Xvar", "Yvar", "literals", "offsets")]
+        if any(a is None for a in arrays):
+            return None
+        formula = QdimacsFormula(arrays[0], arrays[1], arrays[2], arrays[3],
+                                 meta["num_vars"], meta["num_clauses"])
+        return formula
+
+    def save_formula(self, formula):
+        _save_array(self._file("Xvar.npy"), formula.Xvar)
+        _save_array(self._file("Yvar.npy"), formula.Yvar)
+        _save_array(self._file("literals.npy"), formula.literals)
+        _save_array(self._file("offsets.npy"), formula.offsets)
+        meta = json.dumps({"num_vars": formula.num_vars, "num_clauses": formula.num_clauses})
+        _atomic_write(self._file("formula.json"), lambda f: f.write(meta.encode()))
+
+    def load_text(self, name):
+        path = self._file(name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as f:
+            return f.read()
+
+    def save_text(self, name, text):
+        _atomic_write(self._file(name), lambda f: f.write(text.encode()))
+
+    def cached_file(self, name):
+        path = self._file(name)
+        return path if os.path.isfile(path) else None
+
+    def save_file(self, name, src_path):
+        def write(f):
+            with open(src_path, "rb") as fsrc:
+                shutil.copyfileobj(fsrc, f)
+        _atomic_write(self._file(name), write)
+
+    @staticmethod
+    def _unates_digest(pos, neg):
+        h = hashlib.sha256(np.ascontiguousarray(pos, dtype=np.int32).tobytes())
+        h.update(b"\nneg")
+        h.update(np.ascontiguousarray(neg, dtype=np.int32).tobytes())
+        return h.hexdigest()
+
+    def load_unates(self):
+        # unates.json is written last and names the digest of both arrays,
+        # so a pair torn by a concurrent save is treated as a miss
+        meta_path = self._file("unates.json")
+        if not os.path.isfile(meta_path):
+            return None
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        pos = _load_array(self._file("posunate.npy"))
+        neg = _load_array(self._file("negunate.npy"))
+        if pos is None or neg is None or meta.get("digest") != self._unates_digest(pos, neg):
+            return None
+        return pos.tolist(), neg.tolist()
+
+    def save_unates(self, PosUnate, NegUnate):
+        pos = np.asarray(PosUnate, dtype=np.int32)
+        neg = np.asarray(NegUnate, dtype=np.int32)
+        _save_array(self._file("posunate.npy"), pos)
+        _save_array(self._file("negunate.npy"), neg)
+        meta = json.dumps({"digest": self._unates_digest(pos, neg)})
+        _atomic_write(self._file("unates.json"), lambda f: f.write(meta.encode()))
+
+    def load_graph(self, Yvar):
+        arrays = [_load_array(self._file("primal_%s.npy" % name))
+                  for name in ("indptr", "indices", "present")]
+        if any(a is None for a in arrays):
+            return None
+        return PrimalGraph(Yvar, arrays[0], arrays[1], arrays[2])
+
+    def save_graph(self, ng):
+        _save_array(self._file("primal_indptr.npy"), ng.indptr)
+        _save_array(self._file("primal_indices.npy"), ng.indices)
+        _save_array(self._file("primal_present.npy"), ng.present)
+
+
+class SampleCache:
+    """Packed sample matrices keyed by the sha256 of the sampling CNF
+    (weight lines included), the seed, the projection and the number of
+    sampling workers, which changes the samples drawn for a seed.
+
+    The sample count is stored with the entry rather than in the key, so a
+    request for fewer samples is served from a prefix and a request for
+    more only draws the difference. Entries are evicted least recently
+    used first (by file mtime, refreshed on every hit) once their total
+    size exceeds the budget.
+    """
+
+    def __init__(self, cache_dir, budget_bytes):
+        self.path = os.path.join(cache_dir, "samples", _SAMPLE_CACHE_VERSION)
+        self.budget = budget_bytes
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, sampling_cnf, seed, projection=None, workers=1):
+        h = hashlib.sha256(sampling_cnf.encode())
+        h.update(b"\nseed %d" % (int(seed)))
+        if projection is not None:
+            h.update(b"\nprojection")
+            h.update(np.ascontiguousarray(projection, dtype=np.int64).tobytes())
+        if workers > 1:
+            h.update(b"\nworkers %d" % (int(workers)))
+        return h.hexdigest()
+
+    def _files(self, key):
+        base = os.path.join(self.path, key)
+        return base + ".npy", base + ".json"
+
+    def load(self, sampling_cnf, seed, num_samples, projection=None, store=None, workers=1):
+        """Up to num_samples cached samples (with room for num_samples), or None."""
+        bits_path, meta_path = self._files(self.key(sampling_cnf, seed, projection, workers))
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            bits = np.load(bits_path, mmap_mode="r")
+            os.utime(bits_path)
+        except (OSError, ValueError):
+            return None
+        return SampleMatrix.from_bits(bits, min(meta["num_samples"], num_samples), num_samples,
+                                      meta["num_vars"], projection, store)
+
+    def save(self, sampling_cnf, seed, samples, projection=None, workers=1):
+        key = self.key(sampling_cnf, seed, projection, workers)
+        bits_path, meta_path = self._files(key)
+        try:
+            with open(meta_path, "r") as f:
+                if json.load(f)["num_samples"] >= len(samples):
+                    return
+        except (OSError, ValueError):
+            pass
+        try:
+            _save_array(bits_path, samples.bits[:, :(len(samples) + 7) // 8])
+            meta = json.dumps({"num_vars": samples.num_vars, "num_samples": len(samples)})
+            _atomic_write(meta_path, lambda f: f.write(meta.encode()))
+            self.evict(keep=key)
+        except OSError as exc:
+            cprint("c [cache] could not store samples:", exc)
+
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name[:-4]))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.budget:
+                break
+            if key == keep:
+                continue
+            for path in self._files(key):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            total -= size
+
+
+def open_formula_cache(cache_dir, inputfile):
+    if not cache_dir:
+        return None
+    try:
+        return FormulaCache(cache_dir, inputfile)
+    except OSError as exc:
+        cprint("c [cache] formula cache disabled:", exc)
+        return None
+
+
+def open_sample_cache(cache_dir, budget_mb):
+    if not cache_dir or budget_mb <= 0:
+        return None
+    try:
+        return SampleCache(cache_dir, int(budget_mb * (1 << 20)))
+    except OSError as exc:
+        cprint("c [cache] sample cache disabled:", exc)
+        return None
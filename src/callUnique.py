@@ -26,10 +26,12 @@ from src.DefinabilityChecker import DefinabilityChecker
 import networkx as nx
 from src.logging_utils import cprint
 
-def unique_function(qdimacs_list, Xvar, Yvar, dg, Unates):
+def unique_function(formula, vindex, dg):
+	Xvar = vindex.Xvar
+	Yvar = vindex.Yvar
 
 	offset = 5*(len(Yvar)+len(Xvar))+100
-	UniqueChecker = DefinabilityChecker(qdimacs_list,Yvar)
+	UniqueChecker = DefinabilityChecker(formula,Yvar)
 	UniqueVars = []
 	UniqueDef = ''
 	declare_wire = ''
@@ -40,7 +42,7 @@ def unique_function(qdimacs_list, Xvar, Yvar, dg, Unates):
 
 	for yvar in Yvar:
 
-		if yvar in Unates:
+		if vindex.is_unate(yvar):
 			itr += 1
 			continue
 
@@ -63,22 +65,18 @@ def unique_function(qdimacs_list, Xvar, Yvar, dg, Unates):
 					for defvar in clause:
 						if int(defvar) < 0:
 							clauseString += "~"
-						if abs(defvar) in Yvar:
-							if int(yvar) not in list(dg.nodes):
-								dg.add_node(int(yvar))
-							if abs(int(defvar)) not in list(dg.nodes):
-								dg.add_node(abs(int(defvar)))
+						if vindex.is_y(abs(defvar)):
 							dg.add_edge(yvar,abs(int(defvar)))
 							clauseString += "w%s &" %(abs(defvar))
 							
-						elif abs(defvar) in Xvar:
+						elif vindex.is_x(abs(defvar)):
 							clauseString += "i%s & " %(abs(defvar))
 							
 						else:
 							clauseString += "utemp%s &  " %(abs(defvar))
 							
 					if len(definitions) > 1:
-						if int(lists[1]) not in Yvar:
+						if not vindex.is_y(int(lists[1])):
 							countoffset += 1
 							declare_wire += "wire utemp%s;\n" %(lists[1])
 							UniqueDef += "assign utemp%s = %s;\n" %(lists[1],clauseString.strip("& "))
@@ -90,9 +88,9 @@ def unique_function(qdimacs_list, Xvar, Yvar, dg, Unates):
 						clauseString = ''
 						if int(defvar) < 0:
 							clauseString += "~"
-						if abs(defvar) in Xvar:
+						if vindex.is_x(abs(defvar)):
 							clauseString += "i%s;\n" %(abs(defvar))
-						elif abs(defvar) in Yvar:
+						elif vindex.is_y(abs(defvar)):
 							clauseString += "w%s;\n" %(abs(defvar))
 						else:
 							cprint("c [unique_function] check unique defination")
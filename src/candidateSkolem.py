@@ -26,67 +26,105 @@ import numpy as np
 from sklearn import tree
 import pydotplus
 import networkx as nx
+import psutil
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from numpy import count_nonzero
 from src import runtime_env  # noqa: F401
 from src.logging_utils import cprint
+from src.bittree import BitTreeClassifier
+from src.samplematrix import SampleMatrix
 import collections
 
 
-def treepaths(root, is_leaves, children_left, children_right, data_feature_names, feature, values, dependson, leave_label, Xvar, Yvar, index, size,args):
-    if (is_leaves[root]):
-        if not args.multiclass:
-            temp = values[root]
-            temp = temp.ravel()
-            if(temp[1] < temp[0]):
-                return(['val=0'], dependson)
-            else:
-                return(['1'], dependson)
+# rows per block when a pass over all samples need not be dense at once
+_ROW_BLOCK = 1 << 16
+
+# sample cells unpacked at once while packing a cluster's rows
+_UNPACK_CELLS = 1 << 24
+
+
+def _ite(name, lo, hi):
+    # lo if name is 0 else hi, folding constant branches
+    if lo == hi and lo in ("0", "1"):
+        return lo
+    if lo == "0":
+        return name if hi == "1" else "(%s & %s)" % (name, hi)
+    if hi == "0":
+        return "~" + name if lo == "1" else "(~%s & %s)" % (name, lo)
+    if lo == "1":
+        return "(~%s | %s)" % (name, hi)
+    if hi == "1":
+        return "(%s | %s)" % (name, lo)
+    return "((~%s & %s) | (%s & %s))" % (name, lo, name, hi)
+
+
+def treeFunctions(clf, featname, yvar, vindex, args):
+    """Candidates of the yvar from a fitted tree, as nested multiplexers:
+    one ITE per internal node (folded when a branch is constant), so the
+    size is linear in the tree rather than in its number of paths.
+
+    All outputs of the cluster are built in one pass over the nodes,
+    children first (sklearn numbers a node after its parent), from leaf
+    labels decoded once into a (nodes, outputs) bit matrix. Also returns,
+    per variable, the Y features of the nodes above a leaf labelled 1:
+    the dependencies of the candidate."""
+    t = clf.tree_
+    left = t.children_left
+    right = t.children_right
+    leaves = left == right
+    value = t.value[:, 0, :]
+    if not args.multiclass:
+        if value.shape[1] == 1:
+            leafvalue = np.full((t.node_count, 1), int(np.asarray(clf.classes_)[0]))
         else:
-            node_label = leave_label[root]
-            bool_res = format(node_label,"0"+str(size)+"b")
-            if int(bool_res[index]):
-                return (["1"],dependson)
-            else:
-                return(["val=0"],dependson)
-    	
-
-
-    left_subtree, dependson = treepaths(
-        children_left[root], is_leaves, children_left,
-        children_right, data_feature_names, feature, values, dependson,leave_label, Xvar, Yvar, index, size,args)
-    right_subtree, dependson = treepaths(
-        children_right[root], is_leaves, children_left,
-        children_right, data_feature_names, feature, values, dependson,leave_label, Xvar, Yvar, index, size,args)
-
-    # conjunction of all the literal in a path where leaf node has label 1
-    # Dependson is list of Y variables on which candidate SKF of y_i depends
-    list_left = []
-    for leaf in left_subtree:
-        if leaf != "val=0":
-            if data_feature_names[feature[root]] in Yvar:
-                dependson.append(data_feature_names[feature[root]])
-            # the left part
-                list_left.append("~w" + str(data_feature_names[feature[root]]) + ' & ' + leaf)
-            else:
-                list_left.append("~i" + str(data_feature_names[feature[root]]) + ' & ' + leaf)
-           
-    list_right = []
-    for leaf in right_subtree:
-        if leaf != "val=0":
-            if data_feature_names[feature[root]] in Yvar:
-                dependson.append(data_feature_names[feature[root]])
-                list_left.append("w"+str(data_feature_names[feature[root]]) + ' & ' + leaf)
-            else:
-                list_left.append("i"+str(data_feature_names[feature[root]]) + ' & ' + leaf)
-    dependson = list(set(dependson))
-    return(list_left + list_right, dependson)
+            leafvalue = (value[:, 1] >= value[:, 0]).astype(np.int64)[:, None]
+    else:
+        # most frequent class of every output at every node
+        classes = clf.classes_ if t.n_outputs > 1 else [clf.classes_]
+        labels = np.column_stack([np.asarray(c)[np.argmax(t.value[:, j, :len(c)], axis=1)]
+                                  for j, c in enumerate(classes)]).astype(np.int64)
+        if t.n_outputs == len(yvar) > 1:
+            # multi-output tree: one 0/1 output per variable
+            leafvalue = labels
+        else:
+            # class ids from binary_to_int, whose last len(yvar) bits are the variables
+            leafvalue = np.unpackbits(labels.astype(np.uint8), axis=1)[:, -len(yvar):].astype(np.int64)
+
+    names = ["w%s" % (var) if vindex.is_y(var) else "i%s" % (var) for var in featname]
+    # positive[node, i]: some leaf below node is labelled 1 for output i
+    positive = (leafvalue == 1) & leaves[:, None]
+    expr = [None] * t.node_count
+    for node in range(t.node_count - 1, -1, -1):
+        if leaves[node]:
+            expr[node] = ["1" if bit else "0" for bit in leafvalue[node]]
+            continue
+        # left: feature == 0, right: feature == 1
+        lo = expr[left[node]]
+        hi = expr[right[node]]
+        expr[left[node]] = expr[right[node]] = None
+        positive[node] = positive[left[node]] | positive[right[node]]
+        name = names[t.feature[node]]
+        expr[node] = [_ite(name, a, b) for a, b in zip(lo, hi)]
+
+    isy = np.array([vindex.is_y(var) for var in featname], dtype=bool)
+    depends = positive & (~leaves & isy[np.where(leaves, 0, t.feature)])[:, None]
+    psi_dict = {}
+    D_dict = {}
+    for i in range(len(yvar)):
+        psi_dict[yvar[i]] = expr[0][i]
+        D_dict[yvar[i]] = list({featname[f] for f in t.feature[depends[:, i]]})
+    return psi_dict, D_dict
 
-def createDecisionTree(featname, featuredata, labeldata, yvar, args, Xvar, Yvar):
+
+def createDecisionTree(featname, featuredata, labeldata, yvar, args, vindex, sample_weight=None):
+    if sample_weight is None:
+        sample_weight = np.ones(len(labeldata))
     clf = tree.DecisionTreeClassifier(
         criterion='gini',
         min_impurity_decrease=args.gini, random_state=args.seed)
-    clf = clf.fit(featuredata, labeldata)
+    clf = clf.fit(featuredata, labeldata, sample_weight=sample_weight)
     if args.showtrees:
         dot_data = tree.export_graphviz(clf,
                                         feature_names=featname,
@@ -104,61 +142,41 @@ def createDecisionTree(featname, featuredata, labeldata, yvar, args, Xvar, Yvar)
                 dest = graph.get_node(str(edges[edge][i]))[0]
                 dest.set_fillcolor(colors[i])
         graph.write_png(str(yvar) + ".png")
-    values = clf.tree_.value
-    n_nodes = clf.tree_.node_count
-    children_left = clf.tree_.children_left
-    children_right = clf.tree_.children_right
-    feature = clf.tree_.feature
-    threshold = clf.tree_.threshold
-    leaves = children_left == -1
-    leaves = np.arange(0, n_nodes)[leaves]
-    node_depth = np.zeros(shape=n_nodes, dtype=np.int64)
-    leave_label = np.zeros(shape=n_nodes, dtype=np.int64)
-    is_leaves = np.zeros(shape=n_nodes, dtype=bool)
-    stack = [(0, -1)]  # seed is the root node id and its parent depth
-
-    while len(stack) > 0:
-        node_id, parent_depth = stack.pop()
-        node_depth[node_id] = parent_depth + 1
-        if (children_left[node_id] != children_right[node_id]):
-            stack.append((children_left[node_id], parent_depth + 1))
-            stack.append((children_right[node_id], parent_depth + 1))
-        else:
-            is_leaves[node_id] = True
-            leave_label[node_id]=clf.classes_[np.argmax(clf.tree_.value[node_id])]
-    
-    D_dict = {}
-    psi_dict = {}
+    psi_dict, D_dict = treeCandidates(clf, featname, labeldata, yvar, args, vindex, sample_weight)
+    return psi_dict, D_dict, clf
 
-    for i in range(len(yvar)):
-        D = []
-        paths, D = treepaths(0, is_leaves, children_left, children_right, featname, feature, values, D, leave_label, Xvar, Yvar, i, len(yvar), args)
-        psi_i = ''
-
-        if is_leaves[0]:
-            if len(yvar) == 1:
-                len_one = count_nonzero(labeldata)
-                if len_one >= int(len(labeldata)/2):
-                    paths = ["1"]
-                else:
-                    paths = ["0"]
-            else:
-                if "val=0" in paths:
-                    paths = ["0"]
-                else:
-                    paths = ["1"]  
-        paths = [p.strip() for p in paths if p and p.strip()]
-        if len(paths) == 0:
-            paths = ["0"]
-            D = []
-
-        psi_i = " | ".join("( " + path + " )" for path in paths)
-        D_dict[yvar[i]] = D
-        psi_dict[yvar[i]] = psi_i.strip()
-    
+
+def treeCandidates(clf, featname, labeldata, yvar, args, vindex, sample_weight):
+    psi_dict, D_dict = treeFunctions(clf, featname, yvar, vindex, args)
+    if clf.tree_.node_count == 1:
+        # a single leaf: the (weighted) majority for one variable, as before
+        if len(yvar) == 1:
+            len_one = sample_weight[np.asarray(labeldata).reshape(len(labeldata), -1).any(axis=1)].sum()
+            psi_dict[yvar[0]] = "1" if len_one >= int(sample_weight.sum()/2) else "0"
+        D_dict = {var: [] for var in yvar}
     return psi_dict, D_dict
+
+
+def bitsetDecisionTree(featname, samples, yvar, args, vindex):
+    """createDecisionTree with the bitset learner: fitted on the packed
+    columns of samples in place, without a dense feature matrix."""
+    labeldata = clusterLabels(samples.columns(yvar), args)
+    clf = BitTreeClassifier(min_impurity_decrease=args.gini, random_state=args.seed)
+    clf.fit(samples.packed(), labeldata, samples.positions(featname))
+    if args.showtrees:
+        cprint("c [learnCandidate] --showtrees needs --learner sklearn")
+    psi_dict, D_dict = treeCandidates(clf, featname, labeldata, yvar, args, vindex, np.ones(len(labeldata)))
+    return psi_dict, D_dict, clf
          
 
+def clusterLabels(label, args):
+    # the (samples, variables) bits of a cluster as the learner's labels
+    if args.multioutput and label.shape[1] > 1:
+        # one 0/1 output per variable instead of 2^k packed classes
+        return label
+    return binary_to_int(label)
+
+
 def binary_to_int(lst):
 	lst = np.array(lst)
 	# filling the begining with zeros to form bytes
@@ -168,80 +186,266 @@ def binary_to_int(lst):
 	label = np.packbits(lst,axis=1)
 	return label
 
-def learnCandidate(Xvar, Yvar, UniqueVars, PosUnate, NegUnate, samples, dg, ng, args):
-    
+def candidateClusters(vindex, ng, args):
+    """Candidates of the unate variables and the Y clusters to learn."""
+    Yvar = vindex.Yvar
     candidateSkf = {}
-    samples_X = samples[:, (np.array(Xvar)-1)]
     disjointSet = []
-    clusterY = []
+    clusterY = set()
 
-    for var in PosUnate:
+    for var in vindex.posunate:
         candidateSkf[var] = " 1 "
-        if (args.multiclass) and (var in list(ng.nodes)):
-            ng.remove_node(var)
     
-    for var in NegUnate:
+    for var in vindex.negunate:
         candidateSkf[var] = " 0 "
-        if (args.multiclass) and (var in list(ng.nodes)):
-            ng.remove_node(var)
-        
-    for var in UniqueVars:
-        if (args.multiclass) and (var in list(ng.nodes)):
-            ng.remove_node(var)
+
+    if args.multiclass:
+        ng.remove_nodes_from(vindex.posunate)
+        ng.remove_nodes_from(vindex.negunate)
+        ng.remove_nodes_from(vindex.unique)
     
     for var in Yvar:
-        if (var in UniqueVars) or (var in PosUnate) or (var in NegUnate):
+        if vindex.is_known(var):
             continue
         if args.multiclass:
-            if var in list(ng.nodes):
-                Yset = []
-                hoppingDistance = args.hop
-                while (hoppingDistance > 0):
-                    hop_neighbour = list(nx.single_source_shortest_path_length(ng,var,cutoff = hoppingDistance))
-                    if len(hop_neighbour) < args.clustersize:
-                        break
-                    else:
-                        hop_neighbour = []
-                    hoppingDistance -= 1
-                
-                if len(hop_neighbour) == 0:
-                    hop_neighbour = [var]
-                
-                for var2 in hop_neighbour:
-                    ng.remove_node(var2)
-                    Yset.append(var2)
-                    clusterY.append(var2)
+            if ng.has_node(var):
+                Yset = ng.cluster(var, args.hop, args.clustersize)
+                ng.remove_nodes_from(Yset)
+                clusterY.update(Yset)
                 disjointSet.append(Yset)
             else:
                 if var not in clusterY:
                     disjointSet.append([var])
         else:
             disjointSet.append([var])
+    return candidateSkf, disjointSet
+
+
+def denseLearner(samples, args):
+    # sklearn fits on a dense copy of the features; samples kept out of
+    # core are learned from their packed columns by the bitset learner
+    return args.learner == "sklearn" and samples.store is None
+
+
+def denseFits(rows, columns, args):
+    # whether sklearn's float32 copy of rows x columns features (plus the
+    # uint8 rows it is made from) fits the sample memory budget
+    frac = float(getattr(args, "sample_mem_frac", 0.3))
+    return frac <= 0 or 5 * rows * columns <= psutil.virtual_memory().available * frac
+
+
+def uniqueRows(samples, featname, labeldata):
+    """Distinct (features over featname, label) rows of the samples: indices
+    of one representative of each, in first-occurrence order, how often
+    each occurs, and the representatives' features packed 8 to a byte."""
+    # the rows are packed into keys straight from the packed columns, a
+    # bounded block of cells at a time; no dense feature matrix is made
+    width = (len(featname) + 7) // 8
+    keys = np.zeros((len(labeldata), 8 * -(-(width + labeldata.shape[1]) // 8)), dtype=np.uint8)
+    block = max(8, _UNPACK_CELLS // max(len(featname), 1))
+    for start in range(0, len(keys), block):
+        keys[start:start + block, :width] = np.packbits(samples.columns(featname, start, start + block), axis=1)
+    keys[:, width:width + labeldata.shape[1]] = labeldata
+    # 64-bit hash of the packed rows; collisions are detected and then the
+    # rows themselves are compared instead
+    words = np.ascontiguousarray(keys).view(np.uint64)
+    mult = np.random.default_rng(0).integers(1, 2**63, size=words.shape[1], dtype=np.uint64) | np.uint64(1)
+    hashes = (words * mult).sum(axis=1, dtype=np.uint64)
+    _, first, inverse, counts = np.unique(hashes, return_index=True, return_inverse=True, return_counts=True)
+    if (keys != keys[first[inverse]]).any():
+        rows = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.shape[1]))).ravel()
+        _, first, counts = np.unique(rows, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    first = first[order]
+    return first, counts[order], keys[first, :width]
+
+
+def clusterFeatures(vindex, samples, dg, Yset):
+    # X and the sampled Y variables that do not depend on the cluster in dg
+    dependent = set(Yset)
+    for yvar in Yset:
+        dependent.update(nx.ancestors(dg,yvar))
+    return vindex.Xvar + [var for var in vindex.Yvar if var not in dependent and samples.has(var)]
+
+
+def fitCluster(vindex, samples, featname, Yset, args):
+    """Fit the tree of one cluster over featname; returns its candidates,
+    their dependencies and the tree. sklearn only sees the distinct rows."""
+    if not denseLearner(samples, args):
+        return bitsetDecisionTree(featname, samples, Yset, args, vindex)
+    labeldata = clusterLabels(samples.columns(Yset), args)
+    rows, counts, packed = uniqueRows(samples, featname, labeldata)
+    if args.verbose >= 2:
+        cprint("c [learnCandidate] %s distinct training rows out of %s" % (len(rows), len(labeldata)))
+    if not denseFits(len(rows), len(featname), args):
+        cprint("c [learnCandidate] %s distinct rows of %s features exceed the memory budget; "
+               "learning %s with the bitset learner" % (len(rows), len(featname), Yset))
+        return bitsetDecisionTree(featname, samples, Yset, args, vindex)
+    featuredata = np.unpackbits(packed, axis=1, count=len(featname))
+    return createDecisionTree(
+        featname, featuredata, labeldata[rows], Yset, args, vindex, counts.astype(np.float64))
+
+
+def addCandidates(vindex, dg, functions, D_set, candidateSkf):
+    # record a cluster's candidates; returns the dependency edges added to dg
+    added = []
+    for var in functions.keys():
+        assert(not vindex.is_known(var))
+        candidateSkf[var] = functions[var]
+        D = [jvar for jvar in set(D_set[var]) if not vindex.is_x(jvar)]
+        for jvar in D:
+            if not dg.has_edge(var, jvar):
+                added.append((var, jvar))
+            dg.add_edge(var, jvar)
+    return added
+
+
+def learnCluster(vindex, samples, dg, Yset, candidateSkf, args):
+    """Learn the candidates of one cluster into candidateSkf; returns the
+    fitted tree, its features and the dependency edges it added to dg."""
+    if args.verbose >= 2:
+        cprint("c [learnCandidate] Learning candidate Skolem functions for Y variables:", Yset)
+    featname = clusterFeatures(vindex, samples, dg, Yset)
+    functions, D_set, clf = fitCluster(vindex, samples, featname, Yset, args)
+    return clf, featname, addCandidates(vindex, dg, functions, D_set, candidateSkf)
+
+
+# state of a learning worker process, set up once by _initLearnWorker
+_WORKER = {}
+
+
+def _initLearnWorker(shm_name, shape, num_samples, num_vars, variables, vindex, args):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    bits = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    samples = SampleMatrix.wrap(bits, num_samples, num_vars, variables)
+    _WORKER.update(shm=shm, samples=samples, vindex=vindex, args=args)
+
+
+def _fitClusterTask(featname, Yset):
+    worker = _WORKER
+    return fitCluster(worker["vindex"], worker["samples"], featname, Yset, worker["args"])
+
+
+def _learnWorkers(vindex, samples, clusters, args):
+    # the samples are shared, but every worker packs the rows of its
+    # cluster, about as large as the packed samples; stay within the
+    # sample memory budget
+    workers = min(int(getattr(args, "learn_workers", 1) or 1), clusters)
+    if workers <= 1:
+        return 1
+    if samples.store is not None:
+        cprint("c [learnCandidate] out-of-core samples are learned serially")
+        return 1
+    frac = float(getattr(args, "sample_mem_frac", 0.3)) or 1.0
+    per_worker = samples.bits.nbytes
+    fit = int(psutil.virtual_memory().available * frac // max(per_worker, 1))
+    if fit < workers:
+        cprint("c [learnCandidate] memory budget allows %s of %s learning workers" % (max(fit, 1), workers))
+    return max(min(workers, fit), 1)
+
+
+def learnClusters(vindex, samples, dg, disjointSet, indices, candidateSkf, args, previous=None):
+    """learnCluster for disjointSet[k], k in indices, in that order; returns
+    {k: (tree, features, added edges)}. Edges a cluster added in `previous`
+    are dropped right before it is refitted.
+
+    With --learn-workers > 1, all clusters are fitted speculatively in a
+    process pool over the features dg gives them now; the samples are in
+    shared memory. Results are then accepted in order. A cluster whose
+    features changed meanwhile (an earlier tree started depending on it) is
+    refitted, so candidates and dg are exactly those of the serial order.
+    """
+    previous = previous or {}
+    models = {}
+    workers = _learnWorkers(vindex, samples, len(indices), args)
+    if args.learner == "sklearn" and samples.store is not None:
+        cprint("c [learnCandidate] out-of-core samples are learned from their packed columns with the bitset learner")
+    if workers <= 1:
+        for k in indices:
+            if k in previous:
+                dg.remove_edges_from(previous[k][2])
+            models[k] = learnCluster(vindex, samples, dg, disjointSet[k], candidateSkf, args)
+        return models
+
+    shm = shared_memory.SharedMemory(create=True, size=max(samples.bits.nbytes, 1))
+    bits = np.ndarray(samples.bits.shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        bits[:] = samples.bits
+        initargs = (shm.name, bits.shape, len(samples), samples.num_vars, samples.variables, vindex, args)
+        refits = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initLearnWorker, initargs=initargs) as pool:
+            submitted = {}
+
+            def submit(k, featname):
+                submitted[k] = (featname, pool.submit(_fitClusterTask, featname, disjointSet[k]))
+
+            for k in indices:
+                submit(k, clusterFeatures(vindex, samples, dg, disjointSet[k]))
+            for pos, k in enumerate(indices):
+                if k in previous:
+                    dg.remove_edges_from(previous[k][2])
+                if args.verbose >= 2:
+                    cprint("c [learnCandidate] Learning candidate Skolem functions for Y variables:", disjointSet[k])
+                featname = clusterFeatures(vindex, samples, dg, disjointSet[k])
+                if featname != submitted[k][0]:
+                    submitted[k][1].cancel()
+                    submit(k, featname)
+                    refits += 1
+                functions, D_set, clf = submitted[k][1].result()
+                models[k] = (clf, featname, addCandidates(vindex, dg, functions, D_set, candidateSkf))
+                # refit the next few clusters early if this one changed their features
+                for m in indices[pos + 1:pos + 1 + 2 * workers]:
+                    featname = clusterFeatures(vindex, samples, dg, disjointSet[m])
+                    if featname != submitted[m][0]:
+                        submitted[m][1].cancel()
+                        submit(m, featname)
+                        refits += 1
+        if args.verbose:
+            cprint("c [learnCandidate] learned %s clusters with %s workers, %s refitted"
+                   % (len(indices), workers, refits))
+    finally:
+        del bits
+        shm.close()
+        shm.unlink()
+    return models
+
+
+def clusterAccuracy(samples, clf, featname, Yset, start):
+    # fraction of samples start.. whose cluster label the tree predicts exactly
+    correct = 0
+    for first in range(start, len(samples), _ROW_BLOCK):
+        stop = first + _ROW_BLOCK
+        featuredata = samples.columns(featname, first, stop).astype(np.float32)
+        labeldata = samples.columns(Yset, first, stop)
+        if not clf.n_outputs_ == len(Yset) > 1:
+            labeldata = binary_to_int(labeldata)
+        predicted = np.asarray(clf.predict(featuredata)).reshape(len(labeldata), -1)
+        correct += int((predicted == labeldata).all(axis=1).sum())
+    return correct / (len(samples) - start)
+
+
+def relearnCandidate(vindex, samples, extra, var, dg, args):
+    """Refit the candidate of var on the samples plus the counterexample
+    neighbourhood samples in extra, and add its dependencies to dg. Only Y
+    variables after var in the order are features, so the order stays valid."""
+    Xvar = vindex.Xvar
+    Yfeatname = [yvar for yvar in vindex.order[vindex.order_pos[var] + 1:] if samples.has(yvar)]
+    featname = Xvar + Yfeatname
+    parts = [samples] + list(extra)
+    combined = SampleMatrix(samples.num_vars, sum(len(part) for part in parts), samples.variables, samples.store)
+    for part in parts:
+        combined.extend(part)
+    functions, D_set, _ = fitCluster(vindex, combined.finish(), featname, [var], args)
+    for jvar in set(D_set[var]):
+        if not vindex.is_x(jvar):
+            dg.add_edge(var, jvar)
+    return functions[var]
+
+
+def learnCandidate(vindex, samples, dg, ng, args):
     
-    for Yset in disjointSet:
-        if args.verbose >= 2:
-            cprint("c [learnCandidate] Learning candidate Skolem functions for Y variables:", Yset)
-        dependent = []
-        for yvar in Yset:
-            depends_on_yvar = list(nx.ancestors(dg,yvar))
-            depends_on_yvar.append(yvar)
-            dependent = dependent + depends_on_yvar
-        Yfeatname = list(set(Yvar)-set(dependent))
-        featname= Xvar + Yfeatname
-        Samples_Y = samples[:,(np.array(Yfeatname)-1)]
-        featuredata = np.concatenate((samples_X,Samples_Y),axis=1)
-        label = samples[:,(np.array(Yset)-1)]
-        labeldata = binary_to_int(label)
-        functions, D_set = createDecisionTree(featname, featuredata, labeldata, Yset, args, Xvar, Yvar)
-
-        for var in functions.keys():
-            assert(var not in UniqueVars)
-            assert(var not in PosUnate)
-            assert(var not in NegUnate)
-            candidateSkf[var] = functions[var]
-            D = list(set(D_set[var])-set(Xvar))
-            for jvar in D:
-                dg.add_edge(var, jvar)
+    candidateSkf, disjointSet = candidateClusters(vindex, ng, args)
+    learnClusters(vindex, samples, dg, disjointSet, range(len(disjointSet)), candidateSkf, args)
 
     if args.verbose:
         cprint("c [learnCandidate] generated candidate functions for all variables.")
@@ -249,4 +453,48 @@ def learnCandidate(Xvar, Yvar, UniqueVars, PosUnate, NegUnate, samples, dg, ng,
     if args.verbose == 2:
         cprint("c [learnCandidate] candidate functions are", candidateSkf)
 
-    return candidateSkf, dg    
+    return candidateSkf, dg
+
+
+def learnCandidateRounds(vindex, draw, start, cap, dg, ng, args):
+    """learnCandidate with the sample count chosen by the learning curve.
+
+    draw(n, samples) returns n samples extending `samples` (None at
+    first). Every round fits the clusters that have not converged, then
+    doubles the samples (up to cap) and scores each of those trees on the
+    samples it has not seen. A cluster converges once that held-out
+    accuracy reaches 1 - tol or gains less than tol over its previous
+    round; only the others are refitted on the larger sample.
+    """
+    tol = args.sampletol
+    candidateSkf, disjointSet = candidateClusters(vindex, ng, args)
+    samples = draw(min(start, cap), None)
+    pending = list(range(len(disjointSet)))
+    models = {}
+    accuracy = {}
+    while True:
+        models.update(learnClusters(vindex, samples, dg, disjointSet, pending, candidateSkf, args, models))
+        seen = len(samples)
+        if not pending or seen >= cap:
+            break
+        samples = draw(min(2 * seen, cap), samples)
+        if len(samples) <= seen:
+            break
+        remaining = []
+        for k in pending:
+            clf, featname, _ = models[k]
+            acc = clusterAccuracy(samples, clf, featname, disjointSet[k], seen)
+            if acc < 1 - tol and (k not in accuracy or acc - accuracy[k] >= tol):
+                remaining.append(k)
+            accuracy[k] = acc
+        cprint("c [learnCandidate] %s samples: %s of %s clusters not converged"
+               % (len(samples), len(remaining), len(disjointSet)))
+        pending = remaining
+
+    if args.verbose:
+        cprint("c [learnCandidate] generated candidate functions for all variables from", len(samples), "samples.")
+
+    if args.verbose == 2:
+        cprint("c [learnCandidate] candidate functions are", candidateSkf)
+
+    return candidateSkf, dg, samples
@@ -23,144 +23,30 @@ THE SOFTWARE.
 '''
 
 
-import networkx as nx
+from src.verilog_writer import VerilogWriter
 
 
-def _wrap_assign(expr, indent="  ", max_terms=200, max_len=4000):
-	if " | " in expr:
-		terms = [t.strip() for t in expr.split(" | ") if t.strip()]
-		sep = " | "
-	elif " & " in expr:
-		terms = [t.strip() for t in expr.split(" & ") if t.strip()]
-		sep = " & "
-	else:
-		return expr
-	if not terms:
-		return ""
-	rebuilt = sep.join(terms)
-	lines = []
-	current = ""
-	for term in terms:
-		if not current:
-			next_str = term
-		else:
-			next_str = current + sep + term
-		if (current and (len(next_str) > max_len or (current.count(sep) + 1) >= max_terms)):
-			lines.append(current)
-			current = term
-		else:
-			current = next_str
-	if current:
-		lines.append(current)
-	if len(lines) <= 1:
-		return rebuilt
-	return (sep + "\n" + indent).join(lines)
+def convert_verilog(formula,dg,out):
+	# writes the FORMULA module to the open file `out`
+	writer = VerilogWriter(out)
+	Xvar = formula.Xvar.tolist()
+	Yvar = formula.Yvar.tolist()
 
+	writer.module("FORMULA", [str(var) for var in Xvar + Yvar] + ["out"])
+	writer.inputs(Xvar + Yvar)
+	writer.outputs(["out"])
+	dg.add_nodes_from(Yvar)
 
-def convert_verilog(input,cluster,dg):
-	ng = nx.Graph() # used only if args.multiclass
+	literals = formula.literals.tolist()
+	offsets = formula.offsets.tolist()
 
-	with open(input, 'r') as f:
-		lines = f.readlines()
-	f.close()
-	itr = 1
-	declare = 'module FORMULA( '
-	declare_input = ''
-	declare_wire = ''
-	assign_wire = ''
-	tmp_array = []
+	for cindex in range(len(offsets) - 1):
+		itr = cindex + 1
+		writer.write("wire t_%s;\n" %(itr))
+		writer.assign_terms("t_%s" %(itr),
+			["~%s" %(-var) if var < 0 else str(var) for var in literals[offsets[cindex]:offsets[cindex + 1]]], "|")
 
-	for line in lines:
-		line = line.strip(" ")
-		if (line == "") or (line == "\n"):
-			continue
-		if line.startswith("c "):
-			continue
+	writer.balanced_tree("out", ["t_%s" %(itr) for itr in range(1, len(offsets))], "&", "tcount_")
+	writer.endmodule()
 
-		if line.startswith("p "):
-			continue
-
-
-		if line.startswith("a"):
-			a_variables = line.strip("a").strip("\n").strip(" ").split(" ")[:-1]
-			for avar in a_variables:
-				declare += "%s," %(avar)
-				declare_input += "input %s;\n" %(avar)
-			continue
-
-		if line.startswith("e"):
-			e_variables = line.strip("e").strip("\n").strip(" ").split(" ")[:-1]
-			for evar in e_variables:
-				tmp_array.append(int(evar))
-				declare += "%s," %(evar)
-				declare_input += "input %s;\n" %(evar)
-				if int(evar) not in list(dg.nodes):
-					dg.add_node(int(evar))
-			continue
-
-		parts = line.strip().split()
-		clause_variable = parts[:-1]
-		if not clause_variable:
-			continue
-
-		declare_wire += "wire t_%s;\n" %(itr)
-		assign_wire += "assign t_%s = " %(itr)
-		itr += 1
-		for var in clause_variable:
-			if int(var) < 0:
-				assign_wire += "~%s | " %(abs(int(var)))
-			else:
-				assign_wire += "%s | " %(abs(int(var)))
-
-		assign_wire = assign_wire.strip("| ")
-		assign_wire = _wrap_assign(assign_wire, indent="  ", max_terms=200)
-		assign_wire += ";\n"
-		
-		### if args.multiclass, then add an edge between variables of the clause ###
-
-		if cluster:
-			for literal1 in clause_variable:
-				literal1 = abs(int(literal1))
-				if literal1 in tmp_array:
-					if literal1 not in list(ng.nodes):
-						ng.add_node(literal1)
-					for literal2 in clause_variable:
-						literal2 = abs(int(literal2))
-						if (literal1 != abs(literal2)) and (literal2 in tmp_array):
-							if literal2 not in list(ng.nodes):
-								ng.add_node(literal2)
-							if not ng.has_edge(literal1, literal2):
-								ng.add_edge(literal1,literal2)
-
-
-
-	count_tempvariable = itr
-
-	declare += "out);\n"
-	declare_input += "output out;\n"
-
-	temp_assign = ''
-	outstr = ''
-
-	itr = 1
-	while itr < count_tempvariable:
-		temp_assign += "t_%s & " %(itr)
-		if itr % 100 == 0:
-			declare_wire += "wire tcount_%s;\n" %(itr)
-			assign_wire += "assign tcount_%s = %s;\n" %(itr,temp_assign.strip("& "))
-			outstr += "tcount_%s & " %(itr)
-			temp_assign = ''
-		itr += 1
-
-	if temp_assign != "":
-		declare_wire += "wire tcount_%s;\n" %(itr)
-		assign_wire += "assign tcount_%s = %s;\n" %(itr,temp_assign.strip("& "))
-		outstr += "tcount_%s & " %(itr)
-	out_expr = outstr.strip("& \n")
-	out_expr = _wrap_assign(out_expr, indent="  ", max_terms=200)
-	outstr = "assign out = %s;\n" %(out_expr)
-
-
-	verilogformula = declare + declare_input + declare_wire + assign_wire + outstr +"endmodule\n"
-
-	return verilogformula, dg, ng
+	return dg
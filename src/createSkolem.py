@@ -29,6 +29,9 @@ import shutil
 import numpy as np
 from src.logging_utils import cprint
 from src.tempfiles import temp_path
+from src.verilog_writer import VerilogWriter
+from src.aig import ErrorMiter, parse_cex
+from src.skolem_circuit import SkolemCircuit
 
 
 def static_bin_path(bin_name):
@@ -44,253 +47,104 @@ def static_bin_path(bin_name):
 			return os.path.abspath(candidate)
 	return os.path.abspath(os.path.join("./dependencies", bin_name))
 
-def _wrap_assign(expr, indent="  ", max_terms=200, max_len=4000):
-	if " | " in expr:
-		terms = [t.strip() for t in expr.split(" | ") if t.strip()]
-		sep = " | "
-	elif " & " in expr:
-		terms = [t.strip() for t in expr.split(" & ") if t.strip()]
-		sep = " & "
-	else:
-		return expr
-	if not terms:
-		return ""
-	rebuilt = sep.join(terms)
-	lines = []
-	current = ""
-	for term in terms:
-		if not current:
-			next_str = term
-		else:
-			next_str = current + sep + term
-		if (current and (len(next_str) > max_len or (current.count(sep) + 1) >= max_terms)):
-			lines.append(current)
-			current = term
-		else:
-			current = next_str
-	if current:
-		lines.append(current)
-	if len(lines) <= 1:
-		return rebuilt
-	return (sep + "\n" + indent).join(lines)
-
-
-
 
-def skolemfunction_preprocess(Xvar, Yvar, PosUnate, NegUnate, UniqueVar, UniqueDef, inputfile_name, output_path=None):
-	declare = 'module SkolemFormula ('
-	declarevar = ''
-	assign = ''
-	wire = ''
-
-	for var in Xvar:
-		declare += "i%s, " %(var)
-		declarevar += "input i%s;\n" %(var)
-
-	for var in Yvar:
-		declare += "o%s, " %(var)
-		declarevar += "output o%s;\n" %(var)
-		if var in PosUnate:
-			assign = "o%s = 1'b1;\n" %(var)
-		if var in NegUnate:
-			assign += "assign o%s = 1'b0;\n" %(var)
-		if var in UniqueVar:
-			assign += "assign o%s = w%s;\n" %(var,var)
-			wire += "wire w%s;\n" %(var)
-
-	declare = declare.strip(", ")+");\n"
-	skolemformula = declare + declarevar + wire + UniqueDef + assign + "endmodule\n"
 
+def skolemfunction_preprocess(vindex, UniqueDef, inputfile_name, output_path=None):
 	if output_path is None:
 		output_path = inputfile_name + "_skolem.v"
 
 	with open(output_path,"w") as f:
-		f.write(skolemformula)
-	f.close()
+		writer = VerilogWriter(f)
+		writer.module("SkolemFormula",
+			["i%s" %(var) for var in vindex.Xvar] + ["o%s" %(var) for var in vindex.Yvar])
+		writer.inputs("i%s" %(var) for var in vindex.Xvar)
+		writer.outputs("o%s" %(var) for var in vindex.Yvar)
+		writer.wires("w%s" %(var) for var in vindex.Yvar if vindex.is_unique(var))
+		writer.write(UniqueDef)
+		for var in vindex.Yvar:
+			if var in vindex.posunate:
+				writer.write("assign o%s = 1'b1;\n" %(var))
+			if var in vindex.negunate:
+				writer.write("assign o%s = 1'b0;\n" %(var))
+			if vindex.is_unique(var):
+				writer.write("assign o%s = w%s;\n" %(var,var))
+		writer.endmodule()
 	
-def createSkolemfunction(inputfile_name, Xvar, Yvar, output_path=None):
-	skolemformula = temp_path(inputfile_name + "_skolem.v")
-	if output_path is None:
-		output_path = inputfile_name + "_skolem.v"
-	
-	content = ''
-	declare = "module SkolemFormula ("
-	declare_input = ""
-	assign = ""
-	for var in Xvar:
-		declare += "i%s, " %(var)
-		declare_input += "input i%s;\n" %(var)
-	for var in Yvar:
-		declare += "o%s, " %(var)
-		declare_input += "output o%s;\n" %(var)
-		assign += "assign o%s = w%s;\n" %(var,var)
-	declare = declare.strip(", ")+");\n"
-
-	with open(skolemformula,"r") as f:
-		lines = f.readlines()
-	f.close()
-
-	for line in lines:
-		if line.startswith("module"):
-			continue
-		if line.startswith("input"):
-			continue
-		if line.startswith("output"):
-			continue
-		if line.startswith("assign out"):
-			continue
-		if line.startswith("endmodule"):
-			continue
-		if line.startswith("assign beta"):
-			var = int(line.strip("assign beta").split("_")[0])
-			line = line.replace('& ~o%s' %(var),"")
-			line = line.replace('& o%s' %(var), "")
-			line = line.replace("o","w")
-		content += line
-	with open(skolemformula,"w") as f:
-		f.write(declare + declare_input + content + assign + "endmodule\n")
-	f.close()
-
-	shutil.copy(skolemformula, output_path)
-	os.unlink(skolemformula)
-
-
-
-
-def createErrorFormula(Xvar, Yvar, UniqueVars, verilog_formula):
-	inputformula = '('
-	inputskolem = '('
-	inputerrorx = 'module MAIN ('
-	inputerrory = ''
-	inputerroryp = ''
-	declarex = ''
-	declarey = ''
-	declareyp = ''
-	for var in Xvar:
-		inputformula += "%s, " % (var)
-		inputskolem += "%s, " % (var)
-		inputerrorx += "%s, " % (var)
-		declarex += "input %s ;\n" % (var)
-	for var in Yvar:
-		inputformula += "%s, " % (var)
-		inputerrory += "%s, " % (var)
-		declarey += "input %s ;\n" % (var) 
-		inputerroryp += "ip%s, " % (var)
-		declareyp += "input ip%s ;\n" % (var)
-		if var in UniqueVars:
-			inputskolem += "%s, " %(var)
-		else:
-			inputskolem += "ip%s, " %(var)
-	inputformula += "out1 );\n"
-	inputformula_sk = inputskolem + "out3 );\n"
-	inputskolem += "out2 );\n"
-	inputerrorx = inputerrorx + inputerrory + inputerroryp + "out );\n"
-	declare = declarex + declarey + declareyp + 'output out;\n' + \
-		"wire out1;\n" + "wire out2;\n" + "wire out3;\n"
-	formula_call = "FORMULA F1 " + inputformula
-	skolem_call = "SKOLEMFORMULA F2 " + inputskolem
-	formulask_call = "FORMULA F2 " + inputformula_sk
-	error_content = inputerrorx + declare + \
-		formula_call + skolem_call + formulask_call
-	error_content += "assign out = ( out1 & out2 & ~(out3) );\n" + \
-		"endmodule\n"
-	error_content += verilog_formula
-	return error_content
-
-
-def addSkolem(error_content, inputfile_name, debug_keep=False):
-	skolemformula = temp_path(inputfile_name + "_skolem.v")
-	with open(skolemformula, 'r') as f:
-		skolemcontent = f.read()
-	f.close()
+def createSkolemfunction(circuit, output_path):
+	# final module: repairs read w<j> instead of o<j> and drop their own literal
+	vindex = circuit.vindex
+	functions = circuit.final_functions()
+	with open(output_path,"w") as f:
+		writer = VerilogWriter(f)
+		writer.module("SkolemFormula", ["i%s" %(var) for var in vindex.Xvar] + ["o%s" %(var) for var in vindex.Yvar])
+		writer.inputs("i%s" %(var) for var in vindex.Xvar)
+		writer.outputs("o%s" %(var) for var in vindex.Yvar)
+		circuit.write_functions(writer, functions)
+		writer.write("".join("assign o%s = w%s;\n" %(var,var) for var in vindex.Yvar))
+		writer.endmodule()
+
+
+
+
+def createErrorFormula(vindex, formula_path, inputfile_name):
+	# MAIN miter module followed by the FORMULA module; the Skolem module is
+	# appended to a copy of this file by addSkolem on every iteration
+	errorhead = temp_path(inputfile_name + "_errorhead.v")
+	Xvar = vindex.Xvar
+	Yvar = vindex.Yvar
+	inputformula = ["%s" %(var) for var in Xvar + Yvar] + ["out1"]
+	inputskolem = ["%s" %(var) for var in Xvar]
+	inputskolem += ["%s" %(var) if vindex.is_unique(var) else "ip%s" %(var) for var in Yvar]
+	with open(errorhead, "w") as f:
+		writer = VerilogWriter(f)
+		writer.module("MAIN", ["%s" %(var) for var in Xvar + Yvar] + ["ip%s" %(var) for var in Yvar] + ["out"])
+		writer.write("".join("input %s ;\n" %(var) for var in Xvar + Yvar))
+		writer.write("".join("input ip%s ;\n" %(var) for var in Yvar))
+		writer.write("output out;\nwire out1;\nwire out2;\nwire out3;\n")
+		writer.write("FORMULA F1 (%s );\n" %(", ".join(inputformula)))
+		writer.write("SKOLEMFORMULA F2 (%s );\n" %(", ".join(inputskolem + ["out2"])))
+		writer.write("FORMULA F2 (%s );\n" %(", ".join(inputskolem + ["out3"])))
+		writer.write("assign out = ( out1 & out2 & ~(out3) );\n")
+		writer.endmodule()
+		with open(formula_path, "r") as fformula:
+			shutil.copyfileobj(fformula, f)
+	return errorhead
+
+
+def writeSkolem(circuit, f):
+	vindex = circuit.vindex
+	writer = VerilogWriter(f)
+	writer.module("SKOLEMFORMULA",
+		["i%s" %(var) for var in vindex.Xvar] + ["o%s" %(var) for var in vindex.Yvar] + ["out"])
+	writer.inputs("i%s" %(var) for var in vindex.Xvar)
+	writer.inputs("o%s" %(var) for var in vindex.Yvar)
+	writer.write("output out ;\n")
+	circuit.write_functions(writer, circuit.func)
+	writer.balanced_tree("out", ["(~(w%s ^ o%s))" %(var,var) for var in vindex.Yvar], "&", "wt")
+	writer.endmodule()
+
+
+def addSkolem(errorhead, circuit, inputfile_name, debug_keep=False):
 	if debug_keep:
 		errorformula = os.path.abspath(inputfile_name + "_errorformula.v")
 	else:
 		errorformula = temp_path(inputfile_name + "_errorformula.v")
-	f = open(errorformula, "w")
-	f.write(error_content)
-	f.write(skolemcontent)
-	f.close()
+	with open(errorformula, "w") as f:
+		with open(errorhead, "r") as fhead:
+			shutil.copyfileobj(fhead, f)
+		writeSkolem(circuit, f)
 
-def createSkolem(candidateSkf, Xvar, Yvar, UniqueVars, UniqueDef, inputfile_name):
-	tempOutputFile = temp_path(inputfile_name + "_skolem.v")  # F(X,Y')
-	inputstr = 'module SKOLEMFORMULA ('
-	declarestr = ''
-	assignstr = ''
-	wirestr = 'wire zero;\nwire one;\n'
-	wirestr += "assign zero = 0;\nassign one = 1;\n"
-	outstr = ''
-	itr = 1
-	wtlist = []
-	
-	for var in Xvar:
-		declarestr += "input i%s;\n" % (var)
-		inputstr += "i%s, " % (var)
-	for var in Yvar:
-		flag = 0
-		declarestr += "input o%s;\n" % (var)
-		inputstr += "o%s, " % (var)
-		wirestr += "wire w%s;\n" % (var)
-		if var not in UniqueVars:
+
+def createSkolem(candidateSkf, vindex, UniqueDef):
+	circuit = SkolemCircuit(vindex)
+	circuit.set_definitions(UniqueDef, [var for var in vindex.Yvar if vindex.is_unique(var)])
+	for var in vindex.Yvar:
+		if not vindex.is_unique(var):
 			if var not in candidateSkf:
 				cprint("c [createSkolem] missing candidate for w%s; defaulting to 0" % (var))
 				candidateSkf[var] = " 0 "
-			assignstr += 'assign w%s = (' % (var)
-			assign_expr = candidateSkf[var].replace(" 1 ", " one ").replace(" 0 ", " zero ")
-			assign_expr = _wrap_assign(assign_expr, indent="    ", max_terms=200)
-			assignstr += assign_expr +");\n"
-		
-		outstr += "(~(w%s ^ o%s)) & " % (var,var)
-		if itr % 10 == 0:
-			flag = 1
-			outstr = outstr.strip("& ")
-			wirestr += "wire wt%s;\n" % (itr)
-			assignstr += "assign wt%s = %s;\n" % (itr, outstr)
-			wtlist.append(itr)
-			outstr = ''
-		itr += 1
-	if(flag == 0):
-		outstr = outstr.strip("& ")
-		wirestr += "wire wt%s;\n" % (itr)
-		assignstr += "assign wt%s = %s;\n" % (itr, outstr)
-		wtlist.append(itr)
-	assignstr += "assign out = "
-	for i in wtlist:
-		assignstr += "wt%s & " % (i)
-	assign_expr = assignstr.strip("& ")
-	assign_expr = _wrap_assign(assign_expr, indent="  ", max_terms=200)
-	assignstr = assign_expr + ";\n"
-	inputstr += " out );\n"
-	declarestr += "output out ;\n"
-	f = open(tempOutputFile, "w")
-	f.write(inputstr + declarestr + wirestr)
-	f.write(UniqueDef.strip("\n")+"\n")
-	f.write(assignstr + "endmodule")
-	f.close()
-
-
-def simply(inputfile_name):
-	skolemformula = temp_path(inputfile_name + "_skolem.v")  # F(X,Y')
-
-	with open(skolemformula,"r") as f:
-		lines = f.readlines()
-	f.close()
-
-	content = ''
-
-	for line in lines:
-		if line.startswith("assign beta"):
-			var = int(line.strip("assign beta").split("_")[0])
-			line.replace('& ~o%s' %(var),"")
-			line.replace('& o%s' %(var), "")
-			line.replace("o","w")
-		content += line
-	
-	with open(skolemformula,"w") as f:
-		f.write(content)
-	f.close()
-	
-
+			circuit.set_expression(var, candidateSkf[var])
+	return circuit
 
 
 def verify(Xvar, Yvar, inputfile_name, verbose=0, debug_keep=False):
@@ -347,3 +201,55 @@ def verify(Xvar, Yvar, inputfile_name, verbose=0, debug_keep=False):
 				cexmodels.append(modelyp)
 				return(1, cexmodels, ret)
 		return(1, [], 0)
+
+
+def createErrorAiger(vindex, formula):
+	# both copies of F are strashed once; only the Skolem part is rebuilt per iteration
+	return ErrorMiter(vindex, formula)
+
+
+def addSkolemAiger(miter, circuit, inputfile_name, debug_keep=False):
+	if debug_keep:
+		errorformula = os.path.abspath(inputfile_name + "_errorformula.aig")
+	else:
+		errorformula = temp_path(inputfile_name + "_errorformula.aig")
+	miter.add_skolem(circuit)
+	miter.write(errorformula)
+
+
+def verifyAiger(miter, Xvar, Yvar, inputfile_name, verbose=0, debug_keep=False):
+	errorformula = temp_path(inputfile_name + "_errorformula.aig")
+	if debug_keep and not os.path.isfile(errorformula):
+		errorformula = os.path.abspath(inputfile_name + "_errorformula.aig")
+	if not os.path.isfile(errorformula):
+		cprint("c [verify] missing error formula:", errorformula)
+		return(0, [0], 1)
+	with tempfile.TemporaryDirectory(prefix="manthan_abc_") as abc_tmpdir:
+		cexfile = os.path.join(abc_tmpdir, inputfile_name + "_cex.txt")
+		abc = static_bin_path("abc")
+		script = "read_aiger %s; sat; write_cex -n %s" %(errorformula, cexfile)
+		cmd = [abc, "-c", script]
+		cprint("c [verify] abc cmd:", " ".join(cmd))
+		result = subprocess.run(cmd, cwd=abc_tmpdir,
+			stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+		if result.returncode != 0:
+			if verbose:
+				cprint("c [verify] abc stdout:", result.stdout.strip())
+				cprint("c [verify] abc stderr:", result.stderr.strip())
+			return(0, [0], 1)
+
+		if os.path.isfile(cexfile):
+			with open(cexfile, 'r') as f:
+				model = f.read().strip(" \n")
+			if model:
+				cex = parse_cex(model, miter.names)
+				if cex is None:
+					cprint("c [verify] could not parse abc counterexample")
+					return(0, [0], 1)
+				modelx, modely, modelyp = np.split(np.array(cex), [len(Xvar), len(Xvar) + len(Yvar)])
+				return(1, [modelx, modely, modelyp], 1)
+		if "UNSATISFIABLE" in result.stdout:
+			return(1, [], 0)
+		if verbose:
+			cprint("c [verify] abc stdout:", result.stdout.strip())
+		return(0, [0], 1)
@@ -24,111 +24,284 @@ THE SOFTWARE.
 
 import tempfile
 import numpy as np
-from numpy import count_nonzero
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from src import runtime_env  # noqa: F401
 from src.logging_utils import cprint
+from src.samplematrix import SampleMatrix
+from src.tempfiles import temp_dir
 import psutil
 
 
-def computeBias(Xvar,Yvar,sampling_cnf, sampling_weights_y_1, sampling_weights_y_0, inputfile_name, SkolemKnown, args):
+def sampleProjection(vindex, args):
+	"""Variables learning reads from the samples: X and Y, without the
+	uniquely defined and unate Y variables when --knownfeatures is 0."""
+	Yvar = [yvar for yvar in vindex.Yvar if args.knownfeatures or not vindex.is_known(yvar)]
+	return np.unique(np.asarray(list(vindex.Xvar) + Yvar, dtype=np.int64))
+
+
+def neighbourhoodSamples(args, sampling_cnf, modelx, Xvar, num_samples, projection, salt):
+	"""Samples near a counterexample: each X literal of modelx is fixed with
+	probability --cexfix. salt (the repair count) varies the choice and the
+	cmsgen seed between counterexamples."""
+	rng = np.random.default_rng(_derived_seed(args.seed, salt, 2))
+	fixed = rng.random(len(Xvar)) < args.cexfix
+	units = "".join("%s 0\n" % (var if value else -var) for var, value, keep in zip(Xvar, modelx, fixed) if keep)
+	seed = _derived_seed(args.seed, salt, 3)
+	return _sample(args, num_samples, sampling_cnf + units, seed, projection, _sample_store(args))
+
+
+_BIAS_SAMPLES = 500
+
+
+def _rounded_ratios(samples, variables):
+	# fraction of samples in which each variable is true, to 2 decimals
+	return np.round(samples.count_ones(variables) / float(len(samples)), 2)
+
+
+def _bias_weights(unknown, weights):
+	return "".join("w %s %s\n" %(yvar,weight) for yvar, weight in zip(unknown, weights.tolist()))
+
+
+def computeBias(vindex, sampling_cnf, inputfile_name, args, cache=None):
+	"""Sampling weights for the undecided Y variables.
+
+	One 500-sample probe per level of --bias-levels, run concurrently.
+	A variable whose frequency stays in (0.35, 0.65) under every level is
+	balanced and takes its frequency under the highest level; otherwise
+	it takes its frequency under the lowest level if that is <= 0.35 and
+	under the highest level if not. With --bias-rounds > 1 the weights are
+	re-probed until no weight moves by more than 0.05.
+	"""
+	unknown = [yvar for yvar in vindex.Yvar if not vindex.is_known(yvar)]
+	levels = sorted(float(level) for level in str(getattr(args, "bias_levels", "0.9,0.1")).split(","))
+	default = sampling_cnf + "".join("w %s %s\n" %(yvar,levels[-1]) for yvar in unknown)
+	probes = [sampling_cnf + "".join("w %s %s\n" %(yvar,level) for yvar in unknown) for level in levels]
 	try:
-		samples_biased_one = generatesample( args, 500, sampling_cnf + sampling_weights_y_1, inputfile_name, 1)
-		samples_biased_zero = generatesample( args, 500, sampling_cnf + sampling_weights_y_0, inputfile_name, 1)
+		with ThreadPoolExecutor(max_workers=len(probes)) as pool:
+			futures = [pool.submit(generatesample, args, _BIAS_SAMPLES, probe, inputfile_name, 1, cache, None, unknown)
+			           for probe in probes]
+		samples = [future.result() for future in futures]
 	except RuntimeError as exc:
 		cprint("c [computeBias] adaptive bias sampling failed, using default weights")
 		if args.verbose >= 2:
 			cprint("c [computeBias] adaptive bias sampling error:", exc)
-		return sampling_cnf + sampling_weights_y_1
+		return default
 
-	bias = ""
+	ratios = np.vstack([_rounded_ratios(part, unknown) for part in samples])
+	q = ratios[0]
+	p = ratios[-1]
+	balanced = ((ratios > 0.35) & (ratios < 0.65)).all(axis=0)
+	weights = np.where(balanced, p,
+	                   np.where(q <= 0.35, np.where(q == 0.0, 0.001, q), np.where(p == 1.0, 0.99, p)))
 
-	for yvar in Yvar:
-		if yvar in SkolemKnown:
-			continue
-		count_one = count_nonzero(samples_biased_one[:,yvar-1])
-		p = round(float(count_one)/500,2)
+	for rnd in range(1, max(int(getattr(args, "bias_rounds", 1)), 1)):
+		try:
+			part = generatesample(args, _BIAS_SAMPLES, sampling_cnf + _bias_weights(unknown, weights), inputfile_name, 1,
+			                      cache, None, unknown)
+		except RuntimeError as exc:
+			cprint("c [computeBias] bias refinement sampling failed, keeping round", rnd, "weights")
+			if args.verbose >= 2:
+				cprint("c [computeBias] bias refinement sampling error:", exc)
+			break
+		observed = np.clip(_rounded_ratios(part, unknown), 0.001, 0.99)
+		change = float(np.abs(observed - weights).max(initial=0.0))
+		weights = observed
+		if args.verbose >= 2:
+			cprint("c [computeBias] bias round %s: max weight change %.3f" %(rnd + 1, change))
+		if change <= 0.05:
+			break
 
-		count_zero = count_nonzero(samples_biased_zero[:,yvar-1])
-		q = round(float(count_zero)/500,2)
+	return sampling_cnf + _bias_weights(unknown, weights)
 
-		if 0.35 < p < 0.65 and 0.35 < q < 0.65:
-			bias += "w %s %s\n" %(yvar,p)
-		elif q <= 0.35:
-			if float(q) == 0.0:
-				q = 0.001
-			bias += "w %s %s\n" %(yvar,q)
-		else:
-			if float(p) == 1.0:
-				p = 0.99
-			bias += "w %s %s\n" %(yvar,p)
-	
-	return sampling_cnf + bias
-		
 
+_CHUNK = 4 * 1024 * 1024
 
 
+def _sampling_workers(args):
+	return max(int(getattr(args, "sampling_workers", 1) or 1), 1)
 
 
-def _max_rows_from_memory(row_len, num_samples, frac):
+def _mem_frac(args):
+	return float(getattr(args, "sample_mem_frac", 0.3))
+
+
+def _max_rows_from_memory(num_vars, num_samples, frac):
 	if frac <= 0:
 		return num_samples
 	available = psutil.virtual_memory().available
-	bytes_per_row = max(row_len - 1, 1)
+	bytes_per_row = max((num_vars + 7) // 8, 1)
 	max_rows = max(int((available * frac) // bytes_per_row), 1)
 	return min(num_samples, max_rows)
 
 
-def _stream_samples(path, num_samples, frac):
-	rows = []
-	row = []
+def _sample_store(args):
+	# --out-of-core: directory for samples that exceed the memory budget
+	return temp_dir() if getattr(args, "out_of_core", False) else None
+
+
+def _new_matrix(num_vars, num_samples, frac, projection, store):
+	# room for num_samples samples if they fit the budget; otherwise in the
+	# on-disk store when there is one, else truncated
+	width = num_vars if projection is None else len(projection)
+	capacity = _max_rows_from_memory(width, num_samples, frac)
+	if capacity >= num_samples:
+		return SampleMatrix(num_vars, num_samples, projection)
+	if store is not None:
+		cprint("c [samples] %s rows exceed the memory budget; storing them memory-mapped in %s" % (num_samples, store))
+		return SampleMatrix(num_vars, num_samples, projection, store)
+	cprint("c [samples] truncated to", capacity, "rows due to memory budget")
+	return SampleMatrix(num_vars, capacity, projection)
+
+
+def _parse_rows(data, row_len, projection=None):
+	# complete sample lines "l1 l2 ... ln 0" -> (rows, n) bool. Literals come
+	# in variable order, so a value is just the sign of its token; lines of
+	# the wrong length are dropped, as are comment and status lines. Only the
+	# tokens of the projection variables are read
+	text = np.frombuffer(data, dtype=np.uint8)
+	if (text > 57).any():
+		data = b"\n".join(line for line in data.split(b"\n") if line.strip()[:1] not in (b"c", b"s", b"S", b"v"))
+		text = np.frombuffer(data, dtype=np.uint8)
+	blank = text <= 32
+	starts = np.flatnonzero(blank[:-1] & ~blank[1:]) + 1
+	if text.size and not blank[0]:
+		starts = np.concatenate(([0], starts))
+	if starts.size == 0:
+		return None, row_len
+	# tokens per line from the number of token starts before each newline
+	counts = np.searchsorted(starts, np.flatnonzero(text == 10))
+	counts = np.unique(np.concatenate((counts, [starts.size])))
+	counts = counts[counts > 0]
+	first = np.concatenate(([0], counts[:-1]))
+	length = counts - first
+	# the last token of a line has to be a lone 0
+	last = starts[first + length - 1]
+	ends_zero = (text[last] == 48) & ((last + 1 == text.size) | blank[np.minimum(last + 1, text.size - 1)])
+	if row_len is None:
+		if not ends_zero.any():
+			return None, row_len
+		row_len = int(length[ends_zero][0])
+	good = first[(length == row_len) & ends_zero]
+	if good.size == 0:
+		return None, row_len
+	columns = np.arange(row_len - 1) if projection is None else projection - 1
+	if good.size == first.size and projection is None:
+		signs = text[starts].reshape(-1, row_len)[:, :-1]
+	else:
+		signs = text[starts[good[:, None] + columns]]
+	return signs != 45, row_len
+
+
+def _read_samples(stream, num_samples, frac, projection=None, store=None):
+	samples = None
 	row_len = None
-	max_rows = None
-	skipped_header = False
-
-	with open(path, "r") as f:
-		buf = ""
-		for chunk in iter(lambda: f.read(1024 * 1024), ""):
-			buf += chunk
-			parts = buf.split()
-			if not buf.endswith((" ", "\n", "\t")):
-				buf = parts.pop() if parts else buf
-			else:
-				buf = ""
-			for tok in parts:
-				if not skipped_header and tok == "SAT":
-					skipped_header = True
-					continue
-				try:
-					val = int(tok)
-				except ValueError:
-					continue
-				if val == 0:
-					if row_len is None:
-						row_len = len(row) + 1
-						max_rows = _max_rows_from_memory(row_len, num_samples, frac)
-					if row_len and len(row) + 1 != row_len:
-						row = []
-						continue
-					if row_len:
-						rows.append((np.array(row, dtype=np.int32) > 0).astype(np.uint8))
-					row = []
-					if max_rows is not None and len(rows) >= max_rows:
-						if max_rows < num_samples:
-							cprint("c [samples] truncated to", max_rows, "rows due to memory budget")
-						return np.vstack(rows) if rows else np.empty((0, 0), dtype=np.uint8)
-				else:
-					row.append(val)
-	if rows:
-		return np.vstack(rows)
-	return np.empty((0, 0), dtype=np.uint8)
-
-
-def generatesample(args, num_samples, sampling_cnf, inputfile_name, weighted):
+	buf = bytearray()
+	for chunk in iter(lambda: stream.read(_CHUNK), b""):
+		buf.extend(chunk)
+		cut = buf.rfind(b"\n") + 1
+		if cut == 0:
+			continue
+		rows, row_len = _parse_rows(bytes(buf[:cut]), row_len, projection)
+		del buf[:cut]
+		if rows is None or len(rows) == 0:
+			continue
+		if samples is None:
+			samples = _new_matrix(row_len - 1, num_samples, frac, projection, store)
+		samples.append(rows)
+		if samples.full():
+			break
+	if buf.strip() and (samples is None or not samples.full()):
+		rows, row_len = _parse_rows(bytes(buf) + b"\n", row_len, projection)
+		if rows is not None and len(rows):
+			if samples is None:
+				samples = _new_matrix(row_len - 1, num_samples, frac, projection, store)
+			samples.append(rows)
+	return samples.finish() if samples is not None else None
+
+
+def _derived_seed(seed, *salt):
+	return int(np.random.SeedSequence([int(seed)] + [int(x) for x in salt]).generate_state(1)[0] >> 1)
+
+
+def _worker_seeds(seed, workers):
+	# worker 0 keeps the user's seed, so one worker reproduces a serial run
+	return [int(seed)] + [_derived_seed(seed, i) for i in range(1, workers)]
+
+
+def _worker_shares(num_samples, workers):
+	# whole 64-sample words per worker, so the merge is a plain byte copy
+	share = 64 * -(-num_samples // (64 * workers))
+	shares = []
+	while num_samples > 0:
+		shares.append(min(share, num_samples))
+		num_samples -= shares[-1]
+	return shares
+
+
+# cmsgen can write into an inherited pipe only where /dev/fd exists
+_PIPE_SAMPLES = os.name == "posix"
+
+
+def _run_cmsgen_file(cmsgen, tmpdir, num_samples, seed, frac, projection=None, store=None):
+	# without /dev/fd (Windows) cmsgen writes a sample file that is parsed
+	# once it exits; each worker has its own seed and so its own file
+	samplefile = os.path.join(tmpdir, "samples_%s.out" % (seed))
+	cmd = [cmsgen, "--samples", str(int(num_samples)),
+	       "-s", str(seed), "--samplefile", samplefile, "sample.cnf"]
+	try:
+		subprocess.run(cmd, cwd=tmpdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	except OSError as exc:
+		raise RuntimeError("sample generation failed: %s (%s)" % (" ".join(cmd), exc))
+	samples = None
+	if os.path.isfile(samplefile):
+		with open(samplefile, "rb") as stream:
+			samples = _read_samples(stream, int(num_samples), frac, projection, store)
+		os.unlink(samplefile)
+	if samples is None:
+		raise RuntimeError("sample generation failed: %s" % (" ".join(cmd)))
+	return samples
+
+
+def _run_cmsgen(cmsgen, tmpdir, num_samples, seed, frac, projection=None, store=None):
+	# cmsgen writes the samples into a pipe that is parsed while it runs
+	if not _PIPE_SAMPLES:
+		return _run_cmsgen_file(cmsgen, tmpdir, num_samples, seed, frac, projection, store)
+	read_fd, write_fd = os.pipe()
+	cmd = [cmsgen, "--samples", str(int(num_samples)),
+	       "-s", str(seed), "--samplefile", "/dev/fd/%s" % (write_fd), "sample.cnf"]
+	try:
+		proc = subprocess.Popen(cmd, cwd=tmpdir, stdout=subprocess.DEVNULL,
+		                        stderr=subprocess.DEVNULL, pass_fds=(write_fd,))
+	except OSError as exc:
+		os.close(read_fd)
+		raise RuntimeError("sample generation failed: %s (%s)" % (" ".join(cmd), exc))
+	finally:
+		os.close(write_fd)
+
+	with os.fdopen(read_fd, "rb", buffering=0) as stream:
+		samples = _read_samples(stream, int(num_samples), frac, projection, store)
+		if proc.poll() is None:
+			proc.kill()
+	proc.wait()
+	if samples is None:
+		raise RuntimeError("sample generation failed: %s" % (" ".join(cmd)))
+	return samples
+
+
+def _draw_share(cmsgen, tmpdir, num_samples, seed, frac, projection=None, store=None):
+	# one sampling worker's share; a stream that ends early is a failure
+	samples = _run_cmsgen(cmsgen, tmpdir, num_samples, seed, frac, projection, store)
+	if not samples.full():
+		raise RuntimeError("sample generation stopped after %s of %s samples (seed %s)" % (
+			len(samples), samples.capacity, seed))
+	return samples
+
+
+def _sample(args, num_samples, sampling_cnf, seed, projection=None, store=None):
 	with tempfile.TemporaryDirectory(prefix="manthan_cmsgen_") as tmpdir:
 		tempcnffile = os.path.join(tmpdir, "sample.cnf")
-		tempoutputfile = os.path.join(tmpdir, "samples.out")
 
 		with open(tempcnffile, "w") as f:
 			f.write(sampling_cnf)
@@ -138,11 +311,73 @@ def generatesample(args, num_samples, sampling_cnf, inputfile_name, weighted):
 		if not os.path.isfile(cmsgen):
 			cmsgen = "./dependencies/cmsgen"
 		cmsgen = os.path.abspath(cmsgen)
-		cmd = [cmsgen, "--samples", str(int(num_samples)),
-		       "-s", str(args.seed), "--samplefile", "samples.out", "sample.cnf"]
-		subprocess.run(cmd, cwd=tmpdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-		if not os.path.isfile(tempoutputfile):
-			raise RuntimeError("sample generation failed: %s" % (" ".join(cmd)))
+		frac = _mem_frac(args)
+
+		workers = _sampling_workers(args)
+		shares = _worker_shares(int(num_samples), workers)
+		if len(shares) <= 1:
+			return _run_cmsgen(cmsgen, tmpdir, num_samples, seed, frac, projection, store)
 
-		frac = float(getattr(args, "sample_mem_frac", 0.3))
-		return _stream_samples(tempoutputfile, int(num_samples), frac)
+		# one cmsgen per share with its own derived seed; the streams are
+		# merged in worker order, so the result only depends on the seed
+		seeds = _worker_seeds(seed, len(shares))
+		if args.verbose >= 2:
+			cprint("c [generatesample] sampling with %s cmsgen workers, seeds %s" % (len(shares), seeds))
+		with ThreadPoolExecutor(max_workers=len(shares)) as pool:
+			futures = [pool.submit(_draw_share, cmsgen, tmpdir, share, worker_seed, frac / len(shares), projection,
+			                       store) for share, worker_seed in zip(shares, seeds)]
+		# a failed share is drawn again with its own seed, so the result is
+		# never short (and a short result is never cached); a second
+		# failure is raised
+		parts = []
+		for future, share, worker_seed in zip(futures, shares, seeds):
+			try:
+				parts.append(future.result())
+			except RuntimeError as exc:
+				cprint("c [generatesample] sampling worker with seed %s failed, drawing its share again:" % (worker_seed), exc)
+				parts.append(_draw_share(cmsgen, tmpdir, share, worker_seed, frac / len(shares), projection, store))
+		spilled = [part.store for part in parts if part.store is not None]
+		samples = SampleMatrix(parts[0].num_vars, sum(len(part) for part in parts), parts[0].variables,
+		                       spilled[0] if spilled else None)
+		for part in parts:
+			samples.extend(part)
+		return samples.finish()
+
+
+def generatesample(args, num_samples, sampling_cnf, inputfile_name, weighted, cache=None, previous=None,
+                   projection=None):
+	# previous: samples drawn earlier from the same CNF, seed and projection,
+	# to be extended; projection: the only variables to keep (default all)
+	num_samples = int(num_samples)
+	if projection is not None:
+		projection = np.asarray(projection, dtype=np.int64)
+	store = _sample_store(args)
+	# reloaded samples are copied to the store only if they exceed the budget
+	loaded_store = store
+	if projection is not None and _max_rows_from_memory(len(projection), num_samples, _mem_frac(args)) >= num_samples:
+		loaded_store = None
+	# the samples drawn for a seed depend on the worker count, so it is part of the key
+	workers = _sampling_workers(args)
+	samples = cache.load(sampling_cnf, args.seed, num_samples, projection, loaded_store, workers) if cache else None
+	if previous is not None and (samples is None or len(samples) < len(previous)):
+		samples = SampleMatrix.from_bits(previous.bits, min(len(previous), num_samples), num_samples,
+		                                 previous.num_vars, previous.variables, loaded_store)
+	if samples is not None and len(samples) >= num_samples:
+		if args.verbose >= 2:
+			cprint("c [generatesample] using %s cached samples" % (num_samples))
+		return samples.finish()
+
+	if samples is None:
+		samples = _sample(args, num_samples, sampling_cnf, args.seed, projection, store)
+	else:
+		# only the missing samples are drawn, under a seed derived from the
+		# number already drawn so they do not repeat the earlier ones
+		have = len(samples)
+		seed = _derived_seed(args.seed, have, 1)
+		if args.verbose >= 2:
+			cprint("c [generatesample] extending %s samples by %s" % (have, num_samples - have))
+		samples.extend(_sample(args, num_samples - have, sampling_cnf, seed, projection, store))
+		samples.finish()
+	if cache:
+		cache.save(sampling_cnf, args.seed, samples, projection, workers)
+	return samples
@@ -32,51 +32,8 @@ from src.logging_utils import cprint
 import os
 import numpy as np
 
-def parse(inputfile):
-	with open(inputfile) as f:
-		lines = f.readlines()
-	f.close()
-
-	Xvar = []
-	Yvar = []
-
-	qdimacs_list = []
-	for line in lines:
-		if line.startswith("c"):
-			continue
-		if (line == "") or (line == "\n"):
-			continue
-		if line.startswith("p"):
-			continue
-		if line.startswith("a"):
-			Xvar += line.strip("a").strip("\n").strip(" ").split(" ")[:-1]
-			continue
-		if line.startswith("e"):
-			Yvar += line.strip("e").strip("\n").strip(" ").split(" ")[:-1]
-			continue
-		clause = line.strip(" ").strip("\n").strip(" ").split(" ")[:-1]
-
-		if len(clause) > 0:
-			clause = list(map(int, list(clause)))
-			qdimacs_list.append(clause)
-
-	if (len(Xvar) == 0) or (len(Yvar) == 0) or (len(qdimacs_list) == 0):
-		cprint("c [parse] problem with the files, can not synthesis Skolem functions")
-	
-	
-	Xvar = list(map(int, list(Xvar)))
-	Yvar = list(map(int, list(Yvar)))
-
-	return Xvar, Yvar, qdimacs_list
-
-
-def convertcnf(inputfile, cnffile_name):
-	with open(inputfile,"r") as f:
-		cnfcontent = f.read()
-	f.close()
-
-	cnfcontent = cnfcontent.replace("a ", "c ret ")
-	cnfcontent = cnfcontent.replace("e ", "c ind ")
+def convertcnf(formula, cnffile_name):
+	cnfcontent = formula.to_cnf()
 
 	with open(cnffile_name,"w") as f:
 		f.write(cnfcontent)
@@ -85,6 +42,8 @@ def convertcnf(inputfile, cnffile_name):
 
 
 def preprocess(cnffile_name):
+	# returns the positive and negative unates and whether preprocessing
+	# finished; after a timeout both lists are empty but not conclusive
 
 	preprocess_bin = "./dependencies/static_bin/preprocess"
 	if not os.path.isfile(preprocess_bin):
@@ -98,7 +57,7 @@ def preprocess(cnffile_name):
 			PosUnate = []
 			NegUnate = []
 			cprint("c [preprocess] timeout preprocessing..")
-			return PosUnate, NegUnate
+			return PosUnate, NegUnate, False
 		else:
 			PosUnate = []
 			NegUnate = []
@@ -123,4 +82,4 @@ def preprocess(cnffile_name):
 			else:
 				cprint("c [preprocess] preprocessing error .. contining ")
 				exit()
-			return PosUnate, NegUnate
+			return PosUnate, NegUnate, True
@@ -0,0 +1,100 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+class PrimalGraph:
+    """Y-Y co-occurrence graph of the formula in CSR form.
+
+    Nodes are positions in Yvar; nodes[i] lists the neighbours of Yvar[i]
+    (sorted) as indices[indptr[i]:indptr[i + 1]]. A Y variable is a node
+    only if it occurs in some clause. Nodes can be removed, which hides
+    them from later neighbourhood queries without touching the arrays.
+    """
+
+    def __init__(self, Yvar, indptr, indices, present):
+        self.Yvar = np.asarray(Yvar, dtype=np.int32)
+        self.ypos = {int(v): i for i, v in enumerate(self.Yvar.tolist())}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.present = np.asarray(present, dtype=bool)
+        self.alive = self.present.copy()
+
+    @classmethod
+    def from_formula(cls, formula):
+        # incidence matrix C (clauses x Y) restricted to Y literals; two Y
+        # variables are adjacent iff they share a clause, i.e. (C^T C)[i, j] > 0
+        Yvar = formula.Yvar
+        num_y = len(Yvar)
+        lookup = np.full(max(formula.max_var(), int(Yvar.max(initial=0))) + 1, -1, dtype=np.int64)
+        lookup[Yvar] = np.arange(num_y)
+        col = lookup[np.abs(formula.literals)]
+        ymask = col >= 0
+        row = formula.clause_ids()[ymask]
+        col = col[ymask]
+        present = np.zeros(num_y, dtype=bool)
+        present[col] = True
+
+        incidence = sp.csr_matrix((np.ones(col.size, dtype=np.int32), (row, col)),
+                                  shape=(len(formula), num_y))
+        adjacency = (incidence.T @ incidence).tocsr()
+        adjacency.setdiag(0)
+        adjacency.eliminate_zeros()
+        adjacency.sort_indices()
+        return cls(Yvar, adjacency.indptr, adjacency.indices, present)
+
+    def has_node(self, var):
+        i = self.ypos.get(var)
+        return i is not None and bool(self.alive[i])
+
+    def remove_node(self, var):
+        i = self.ypos.get(var)
+        if i is not None:
+            self.alive[i] = False
+
+    def remove_nodes_from(self, variables):
+        for var in variables:
+            self.remove_node(var)
+
+    def neighbours(self, var):
+        i = self.ypos[var]
+        nbrs = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        return self.Yvar[nbrs[self.alive[nbrs]]].tolist()
+
+    def num_edges(self):
+        return int(self.indices.size // 2)
+
+    def cluster(self, var, hop, clustersize):
+        """Largest hop-neighbourhood of var (at most `hop` hops) with fewer
+        than clustersize nodes, in BFS order; [var] if there is none.
+
+        The BFS is level-synchronous over the CSR arrays and stops as soon
+        as the neighbourhood reaches clustersize.
+        """
+        start = self.ypos[var]
+        seen = np.zeros(self.alive.size, dtype=bool)
+        seen[start] = True
+        order = [np.array([start], dtype=np.int32)]
+        frontier = order[0]
+        size = 1
+        best = [var]
+        for _ in range(hop):
+            if frontier.size == 0:
+                break
+            starts = self.indptr[frontier]
+            ends = self.indptr[frontier + 1]
+            lengths = ends - starts
+            if lengths.sum() == 0:
+                break
+            # gather the neighbour lists of the whole frontier in frontier order
+            gather = np.repeat(ends - lengths.cumsum(), lengths) + np.arange(lengths.sum())
+            nbrs = self.indices[gather]
+            nbrs = nbrs[self.alive[nbrs] & ~seen[nbrs]]
+            _, first = np.unique(nbrs, return_index=True)
+            frontier = nbrs[np.sort(first)]
+            seen[frontier] = True
+            size += frontier.size
+            if size >= clustersize:
+                break
+            order.append(frontier)
+            best = self.Yvar[np.concatenate(order)].tolist()
+        return best
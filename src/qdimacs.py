@@ -0,0 +1,189 @@
+import bz2
+import gzip
+import lzma
+import os
+
+import numpy as np
+
+from src.logging_utils import cprint
+
+
+_CHUNK_LINES = 1 << 16
+
+
+class QdimacsFormula:
+    """Parsed QDIMACS formula.
+
+    Clause i occupies literals[offsets[i]:offsets[i + 1]]; Xvar/Yvar are the
+    universal and existential variables in prefix order.
+    """
+
+    def __init__(self, Xvar, Yvar, literals, offsets, num_vars, num_clauses):
+        self.Xvar = np.asarray(Xvar, dtype=np.int32)
+        self.Yvar = np.asarray(Yvar, dtype=np.int32)
+        self.literals = np.asarray(literals, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.num_vars = int(num_vars)
+        self.num_clauses = int(num_clauses)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def clause(self, i):
+        return self.literals[self.offsets[i]:self.offsets[i + 1]]
+
+    def clause_lengths(self):
+        return np.diff(self.offsets)
+
+    def clause_ids(self):
+        # clause index of every entry of self.literals
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.clause_lengths())
+
+    def clause_list(self):
+        lits = self.literals.tolist()
+        offsets = self.offsets.tolist()
+        return [lits[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+    def max_var(self):
+        if self.literals.size == 0:
+            return 0
+        return int(np.abs(self.literals).max())
+
+    def variables(self):
+        return np.unique(np.abs(self.literals))
+
+    def with_units(self, units):
+        units = np.asarray(units, dtype=np.int32)
+        if units.size == 0:
+            return self
+        offsets = np.concatenate(
+            (self.offsets, self.offsets[-1] + np.arange(1, units.size + 1, dtype=np.int64)))
+        return QdimacsFormula(self.Xvar, self.Yvar,
+                              np.concatenate((self.literals, units)), offsets,
+                              self.num_vars, self.num_clauses)
+
+    def cnf_clauses(self):
+        # DIMACS body: one "l1 l2 ... 0" line per clause
+        if len(self) == 0:
+            return ""
+        terms = np.insert(self.literals, self.offsets[1:], 0)
+        body = " ".join(map(str, terms.tolist())) + " "
+        return body.replace(" 0 ", " 0\n")
+
+    def to_cnf(self):
+        header = "p cnf %s %s\n" % (self.num_vars, self.num_clauses)
+        ret = "c ret %s 0\n" % (" ".join(map(str, self.Xvar.tolist())))
+        ind = "c ind %s 0\n" % (" ".join(map(str, self.Yvar.tolist())))
+        return header + ret + ind + self.cnf_clauses()
+
+
+class _ClauseReader:
+    # Accumulates clause lines and converts them to int32 in bulk; a clause
+    # is terminated by 0 and may span several lines.
+
+    def __init__(self):
+        self.lines = []
+        self.pending = np.zeros(0, dtype=np.int32)
+        self.literals = []
+        self.ends = [np.zeros(1, dtype=np.int64)]
+        self.count = 0
+
+    def add(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= _CHUNK_LINES:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        values = np.fromstring(" ".join(self.lines), dtype=np.int32, sep=" ")
+        self.lines = []
+        if self.pending.size:
+            values = np.concatenate((self.pending, values))
+        zeros = np.flatnonzero(values == 0)
+        if zeros.size == 0:
+            self.pending = values
+            return
+        self.pending = values[zeros[-1] + 1:]
+        values = values[:zeros[-1] + 1]
+        # clause ends as positions in the zero-free literal array
+        ends = zeros - np.arange(zeros.size) + self.count
+        lits = values[values != 0]
+        self.literals.append(lits)
+        self.ends.append(ends.astype(np.int64))
+        self.count += lits.size
+
+    def finish(self):
+        self.flush()
+        if self.pending.size:
+            cprint("c [load_qdimacs] ignoring unterminated clause at end of file")
+        literals = np.concatenate(self.literals) if self.literals else np.zeros(0, dtype=np.int32)
+        offsets = np.concatenate(self.ends)
+        # drop empty clauses ("0" on its own)
+        offsets = offsets[np.concatenate(([True], np.diff(offsets) > 0))]
+        return literals, offsets
+
+
+_COMPRESSED_MAGIC = (
+    (b"\x1f\x8b", gzip.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+    (b"BZh", bz2.open),
+)
+
+
+def open_qdimacs(inputfile):
+    # .gz/.xz/.bz2 inputs are detected by their magic bytes and decompressed
+    # on the fly, so no uncompressed copy is ever written to disk.
+    with open(inputfile, "rb") as f:
+        magic = f.read(6)
+    for prefix, opener in _COMPRESSED_MAGIC:
+        if magic.startswith(prefix):
+            return opener(inputfile, "rt")
+    return open(inputfile, "r")
+
+
+def qdimacs_stem(inputfile):
+    name = os.path.basename(inputfile)
+    for suffix in (".gz", ".xz", ".bz2"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    if name.endswith(".qdimacs"):
+        return name[:-8]
+    return os.path.splitext(name)[0]
+
+
+def load_qdimacs(inputfile):
+    Xvar = []
+    Yvar = []
+    num_vars = None
+    num_clauses = None
+    clauses = _ClauseReader()
+
+    with open_qdimacs(inputfile) as f:
+        for line in f:
+            head = line.lstrip()[:1]
+            if head == "" or head == "c":
+                continue
+            if head == "p":
+                parts = line.split()
+                if len(parts) >= 4:
+                    num_vars = int(parts[2])
+                    num_clauses = int(parts[3])
+                continue
+            if head == "a":
+                Xvar += [int(v) for v in line.split()[1:] if v != "0"]
+                continue
+            if head == "e":
+                Yvar += [int(v) for v in line.split()[1:] if v != "0"]
+                continue
+            clauses.add(line)
+    literals, offsets = clauses.finish()
+
+    if (len(Xvar) == 0) or (len(Yvar) == 0) or (len(offsets) <= 1):
+        cprint("c [load_qdimacs] problem with the files, can not synthesis Skolem functions")
+
+    formula = QdimacsFormula(Xvar, Yvar, literals, offsets, 0, 0)
+    formula.num_vars = num_vars if num_vars is not None else formula.max_var()
+    formula.num_clauses = num_clauses if num_clauses is not None else len(formula)
+    return formula
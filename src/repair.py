@@ -29,6 +29,7 @@ import subprocess
 from src import runtime_env  # noqa: F401
 from src.logging_utils import cprint
 from src.tempfiles import temp_path
+from src.varindex import RepairWorklist
 from dependencies.rc2 import RC2Stratified
 from pysat.formula import WCNF
 
@@ -82,15 +83,16 @@ def addXvaluation(cnfcontent, maxsatWt, maxsatcnf, modelx, Xvar):
     maxsatcnf += "\n" + maxsatstr
     return cnfcontent, maxsatcnf
 
-def callRC2(maxsatcnf, modelyp, UniqueVars, Unates, Yvar, YvarOrder, args):
+def callRC2(maxsatcnf, modelyp, vindex, args):
     wcnf = WCNF(from_string = maxsatcnf)
     wt_softclause = 0
+    Yvar = vindex.Yvar
     for i in range(len(Yvar)):
         yvar = Yvar[i]
 
-        if (yvar in UniqueVars) or (yvar in Unates):
+        if vindex.is_known(yvar):
             continue
-        yindex = np.where(yvar == YvarOrder)[0][0]
+        yindex = vindex.order_pos[yvar]
         weight = len(Yvar) - yindex
 
         if modelyp[i] == 0:
@@ -108,8 +110,8 @@ def callRC2(maxsatcnf, modelyp, UniqueVars, Unates, Yvar, YvarOrder, args):
     diff_count = 0
     for var in model:
         abs_var = abs(var)
-        if (abs_var in Yvar) and (abs_var not in UniqueVars) and (abs_var not in Unates):
-            index = Yvar.index(abs_var)
+        if vindex.is_y(abs_var) and not vindex.is_known(abs_var):
+            index = vindex.ypos[abs_var]
             if (var < 0) and (modelyp[index] == 1):
                 indlist.append(abs_var)
                 diff_count += 1
@@ -119,20 +121,8 @@ def callRC2(maxsatcnf, modelyp, UniqueVars, Unates, Yvar, YvarOrder, args):
     if args.verbose >= 2:
         cprint("c [callRC2] rc2: soft clauses", wt_softclause, "diffs", diff_count, "ind", len(indlist))
     
-    indlist = np.array(indlist)
-    indlist = np.unique(indlist)
-
     # to add variables in indlist according to Y order.
-    YvarOrder_ind = []
-    for i in indlist:
-        yindex = np.where(i == YvarOrder)[0][0]
-        YvarOrder_ind.append(yindex)
-    indlist = []
-    YvarOrder_ind.sort(reverse=True)
-    for i in YvarOrder_ind:
-        indlist.append(YvarOrder[i])
-    indlist = np.array(indlist)
-    return indlist
+    return vindex.sort_by_order(indlist, reverse=True)
 
 
 
@@ -142,17 +132,18 @@ def callRC2(maxsatcnf, modelyp, UniqueVars, Unates, Yvar, YvarOrder, args):
 
 
 
-def callMaxsat(maxsatcnf, modelyp, UniqueVars, Unates, Yvar, YvarOrder, inputfile_name, flag):
+def callMaxsat(maxsatcnf, modelyp, vindex, inputfile_name, flag):
     def pick_executable(preferred_path, fallback_path):
         if os.path.isfile(preferred_path) and os.access(preferred_path, os.X_OK):
             return preferred_path
         return fallback_path
 
     itr = 0
+    Yvar = vindex.Yvar
     for var in Yvar:
-        if (var not in Unates) and (var not in UniqueVars):
+        if not vindex.is_known(var):
             if flag:
-                yindex = np.where(var == YvarOrder)[0][0]
+                yindex = vindex.order_pos[var]
                 weight = len(Yvar) - yindex
             else:
                 weight = 1
@@ -192,23 +183,12 @@ def callMaxsat(maxsatcnf, modelyp, UniqueVars, Unates, Yvar, YvarOrder, inputfil
         else:
             ymap = abs(int(line.split(" ")[1]))
             indlist.append(ymap)
-    indlist = np.array(indlist)
-    indlist = np.unique(indlist)
 
     # to add variables in indlist according to Y order.
-    YvarOrder_ind = []
-    for i in indlist:
-        yindex = np.where(i == YvarOrder)[0][0]
-        YvarOrder_ind.append(yindex)
-    indlist = []
-    YvarOrder_ind.sort(reverse=True)
-    for i in YvarOrder_ind:
-        indlist.append(YvarOrder[i])
-    indlist = np.array(indlist)
-    return indlist
+    return vindex.sort_by_order(indlist, reverse=True)
 
 
-def findUNSATCorePicosat(cnffile,unsatcorefile, satfile, Xvar,Yvar, args):
+def findUNSATCorePicosat(cnffile,unsatcorefile, satfile, vindex, args):
     picosat = static_bin_path("picosat")
     cmd = [picosat, "-s", str(args.seed), "-V", unsatcorefile, cnffile]
     with open(satfile, "w") as out:
@@ -222,9 +202,9 @@ def findUNSATCorePicosat(cnffile,unsatcorefile, satfile, Xvar,Yvar, args):
         clisty = []
         for line in lines:
             v = int(line.strip(" \n"))
-            if v in Xvar:
+            if vindex.is_x(v):
                 clistx.append(v)
-            if v in Yvar:
+            if vindex.is_y(v):
                 clisty.append(v)
         os.unlink(unsatcorefile)
         os.unlink(cnffile)
@@ -233,7 +213,7 @@ def findUNSATCorePicosat(cnffile,unsatcorefile, satfile, Xvar,Yvar, args):
         os.unlink(satfile)
         return 0, [], []
 
-def findUnsatCore(repairYvar, repaircnf, Xvar, Yvar, Count_Yvar, inputfile_name, args):
+def findUnsatCore(repairYvar, repaircnf, vindex, Count_Yvar, inputfile_name, args):
     lines = repaircnf.split("\n")
     for line in lines:
         if line.startswith('p cnf'):
@@ -241,7 +221,7 @@ def findUnsatCore(repairYvar, repaircnf, Xvar, Yvar, Count_Yvar, inputfile_name,
             numCls = int(line.split()[3])
             str_tmp = "p cnf " + str(numVar) + " " + str(numCls)
             break
-    repaircnf = repaircnf.replace(str_tmp, "p cnf " + str(numVar) + " " + str(numCls + Count_Yvar  + len(Xvar)))
+    repaircnf = repaircnf.replace(str_tmp, "p cnf " + str(numVar) + " " + str(numCls + Count_Yvar  + len(vindex.Xvar)))
     repaircnf += repairYvar
     cnffile = temp_path(inputfile_name + "_unsat.cnf")
 
@@ -254,7 +234,7 @@ def findUnsatCore(repairYvar, repaircnf, Xvar, Yvar, Count_Yvar, inputfile_name,
     exists = os.path.isfile(unsatcorefile)
     if exists:
         os.remove(unsatcorefile)
-    ret, clistx, clisty = findUNSATCorePicosat(cnffile, unsatcorefile, satfile, Xvar,Yvar, args)
+    ret, clistx, clisty = findUNSATCorePicosat(cnffile, unsatcorefile, satfile, vindex, args)
     if getattr(args, "verbose", 0) >= 1:
         cprint("c [findUnsatCore] Picosat UNSAT core result: %s" %(ret))
     if ret:
@@ -270,9 +250,8 @@ def findUnsatCore(repairYvar, repaircnf, Xvar, Yvar, Count_Yvar, inputfile_name,
         with open(satfile,"r") as f:
             lines = f.readlines()
         f.close()
-        model = []
         ret = 0
-        modelseq = []
+        modelseq = set()
         for line in lines:
             if line.startswith("SAT") or line.startswith("c") or line.startswith("s") or line.startswith("p"):
                 continue
@@ -284,47 +263,40 @@ def findUnsatCore(repairYvar, repaircnf, Xvar, Yvar, Count_Yvar, inputfile_name,
                     continue
                 if lit == 0:
                     break
-                if abs(lit) in Yvar:
-                    modelseq.append(lit)
-        for yvar in Yvar:
-            if yvar in modelseq:
-                model.append(1)
-            else:
-                model.append(0)
+                if vindex.is_y(abs(lit)):
+                    modelseq.add(lit)
+        model = [1 if yvar in modelseq else 0 for yvar in vindex.Yvar]
         os.unlink(cnffile)
         os.unlink(satfile)
         return ret, model, [], []   
 
 
-def repair(repaircnf, ind, Xvar, Yvar, YvarOrder, UniqueVars, Unates, sigma, inputfile_name, args, flagRC2):
+def repair(repaircnf, ind, vindex, sigma, inputfile_name, args, flagRC2):
     modelyp = sigma[2]
     modelx = sigma[0]
 
-    itr = 0
-    repaired = []
+    repaired = set()
     repairfunctions = {}
-    ind_org = ind.copy()
-    satvar = []
-    while itr < len(ind):
-        repairvar = ind[itr]
-        itr += 1
+    worklist = RepairWorklist(vindex, ind)
+    satvar = set()
+    while worklist:
+        repairvar = worklist.pop()
         
-        if (repairvar in UniqueVars) or (repairvar in Unates) or (repairvar in satvar):
+        if vindex.is_known(repairvar) or (repairvar in satvar):
             continue
 
 
         repairYvar = ''
         count_Yvar = 0
-        allowed_Y = []
 
-        repairvar_index = np.where(YvarOrder == repairvar)[0][0]
+        # Y variables at or after repairvar in the order are allowed in beta
+        repairvar_index = vindex.order_pos[repairvar]
 
-        for jindex in range(repairvar_index,len(Yvar)):  
-            yjvar = YvarOrder[jindex]
-            allowed_Y.append(yjvar)
-            yj_index = np.where(np.array(Yvar) == yjvar)[0][0]
+        for jindex in range(repairvar_index,len(vindex.order)):  
+            yjvar = vindex.order[jindex]
+            yj_index = vindex.ypos[yjvar]
             
-            if (yjvar in UniqueVars) or (yjvar in Unates):
+            if vindex.is_known(yjvar):
                 continue
 
             if yjvar in repaired:
@@ -342,15 +314,15 @@ def repair(repaircnf, ind, Xvar, Yvar, YvarOrder, UniqueVars, Unates, sigma, inp
         if args.verbose:
             cprint("c [repair] repairing %s" %(repairvar))
         
-        ret, model, clistx, clisty = findUnsatCore(repairYvar, repaircnf, Xvar, Yvar, count_Yvar, inputfile_name, args)
+        ret, model, clistx, clisty = findUnsatCore(repairYvar, repaircnf, vindex, count_Yvar, inputfile_name, args)
 
         if ret == 0:
             if args.verbose:
                 cprint("c [repair] gk formula is SAT")
-            satvar.append(repairvar)
-            if (repairvar not in ind_org) and (len(repaired) > 0):
+            satvar.add(repairvar)
+            if (repairvar not in worklist.initial) and (len(repaired) > 0):
                 continue
-            if len(ind) > (len(ind_org) * 50) and flagRC2:
+            if worklist.queued() > (len(worklist.initial) * 50) and flagRC2:
                 cprint("c [repair] too many new repair candidate added.. calling rc2")
                 return 1, repairfunctions
             if args.verbose:
@@ -360,28 +332,16 @@ def repair(repaircnf, ind, Xvar, Yvar, YvarOrder, UniqueVars, Unates, sigma, inp
             index = np.where(diff == 1)[0]
             
             for yk in index:
-                l = itr
-                if (Yvar[yk] not in ind) and (Yvar[yk] not in Unates) and (Yvar[yk] not in UniqueVars):
-                    flag = 0
-                    yk_index = np.where(YvarOrder == Yvar[yk])[0][0]
-                    while (l < len(ind)):
-                        tempyvar = ind[l]
-                        indextemp = np.where(YvarOrder == tempyvar)[0][0]
-                        if indextemp < yk_index:
-                            flag = 1
-                            ind = np.insert(ind, l, Yvar[yk])
-                            break
-                        l = l + 1
-                    if flag == 0:
-                        ind = np.append(ind, Yvar[yk]).astype(int)
+                if not vindex.is_known(vindex.Yvar[yk]):
+                    worklist.push(vindex.Yvar[yk])
         else:
-            repaired.append(repairvar)
+            repaired.add(repairvar)
             if args.verbose:
                 cprint("c [repair] gk formula is UNSAT; creating beta formula")
             
             betaformula = ''
             for x in clistx:
-                x_index = np.where(np.array(Xvar) == x)[0][0]
+                x_index = vindex.xpos[x]
 
                 if modelx[x_index] == 0:
                     betaformula += "~i%s & " %(x)
@@ -389,14 +349,12 @@ def repair(repaircnf, ind, Xvar, Yvar, YvarOrder, UniqueVars, Unates, sigma, inp
                     betaformula += "i%s & " %(x)
                 
             for y in clisty:
-                y_index = np.where(np.array(Yvar) == y)[0][0]
+                y_index = vindex.ypos[y]
 
-                if y in ind:
-                    index = np.where(np.array(ind) == y)[0][0]
-                    if itr - 1 < index:
-                        satvar.append(y)
+                if worklist.is_pending(y):
+                    satvar.add(y)
 
-                if y not in allowed_Y:
+                if vindex.order_pos[y] < repairvar_index:
                     continue
 
                 if modelyp[y_index] == 0:
@@ -410,45 +368,11 @@ def repair(repaircnf, ind, Xvar, Yvar, YvarOrder, UniqueVars, Unates, sigma, inp
             assert(repairfunctions[repairvar] != "")
     return 0, repairfunctions
 
-def updateSkolem(repairfunctions, countRefine, modelyp, inputfile_name, Yvar, args):
-    with open(temp_path(inputfile_name + "_skolem.v"),"r") as f:
-        lines = f.readlines()
-    f.close()
-    skolemcontent = "".join(lines)
+def updateSkolem(repairfunctions, countRefine, modelyp, circuit, vindex, args):
     for yvar in list(repairfunctions.keys()):
-        start_idx = None
-        for i, line in enumerate(lines):
-            if line.strip().startswith("assign w" + str(yvar) + " "):
-                start_idx = i
-                break
-        if start_idx is None:
-            continue
-        old_lines = [lines[start_idx]]
-        i = start_idx
-        while ";" not in lines[i]:
-            i += 1
-            if i >= len(lines):
-                break
-            old_lines.append(lines[i])
-        oldfunction = "".join(old_lines)
-        oldfunctionR = oldfunction.replace("\n", " ").strip()
-        prefix = "assign w%s = " % (yvar)
-        if oldfunctionR.startswith(prefix):
-            oldfunctionR = oldfunctionR[len(prefix):]
-        oldfunctionR = oldfunctionR.rstrip(";").strip()
-        repairformula = "wire beta%s_%s;\nassign beta%s_%s = ( %s );\n" %(yvar,countRefine,yvar,countRefine,repairfunctions[yvar])
-        
-        yindex = np.where(np.array(Yvar) == yvar)[0][0]
-
-        if modelyp[yindex] == 0:
-            newfunction = "assign w%s = (( %s ) | ( beta%s_%s) );\n" %(yvar, oldfunctionR, yvar, countRefine)
-        else:
-            newfunction = "assign w%s = (( %s ) & ~(beta%s_%s) );\n" %(yvar, oldfunctionR, yvar, countRefine)
+        yindex = vindex.ypos[yvar]
+        # modelyp[y] == 0: w | beta, otherwise w & ~beta
+        mode = 0 if modelyp[yindex] == 0 else 1
         if args.verbose >= 2:
-            cprint("c [updateSkolem] Old function for w%s: %s" %(yvar, oldfunction.strip("\n")))
-            cprint("c [updateSkolem] New function for w%s: %s" %(yvar, newfunction.strip("\n")))
-            cprint("c [updateSkolem] Repair function for w%s: %s" %(yvar, repairformula.strip("\n")))
-        skolemcontent = skolemcontent.replace(oldfunction, repairformula + newfunction)
-    with open(temp_path(inputfile_name + "_skolem.v"),"w") as f:
-        f.write(skolemcontent)
-    f.close()
+            cprint("c [updateSkolem] Repair function for w%s: %s (%s)" %(yvar, repairfunctions[yvar], "| beta" if mode == 0 else "& ~beta"))
+        circuit.patch(yvar, countRefine, repairfunctions[yvar], mode)
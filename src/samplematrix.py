@@ -0,0 +1,182 @@
+import os
+import tempfile
+
+import numpy as np
+
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """Number of set bits of a uint64 array, summed over its last axis."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def allocate(shape, dtype, store=None, order="C"):
+    """Zero-filled array; with a store directory it is a memory-mapped file
+    there, unlinked at once so it goes away with the array."""
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if store is None or size == 0:
+        return np.zeros(shape, dtype=dtype, order=order)
+    fd, path = tempfile.mkstemp(prefix="manthan_samples_", suffix=".bin", dir=store)
+    try:
+        os.ftruncate(fd, size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape, order=order)
+    finally:
+        os.close(fd)
+        os.unlink(path)
+
+
+def _unpack_rows(bits, start, stop):
+    block = bits[:, start // 8:(stop + 7) // 8]
+    return np.unpackbits(block, axis=1, count=stop - start, bitorder="little").T.astype(bool)
+
+
+class SampleMatrix:
+    """Samples over variables 1..num_vars, bit-packed and column-major.
+
+    Only the variables in `variables` (default: all of them, sorted) are
+    stored; the i-th of them is row i of `bits`. Sample r is bit r % 8 of
+    byte r // 8 of that row (little bit order), and rows are padded to
+    whole 64-bit words. Samples are appended in blocks while they are parsed; only a
+    multiple of 8 of them is packed at a time, the rest waits in `pending`
+    until the next block or finish().
+
+    Consumers read the packed bits in place: words() is a zero-copy view
+    of one variable, count_ones() is a popcount over the words, and
+    unpack_into() writes columns straight into a caller's feature matrix.
+
+    With a `store` directory the bits live in a memory-mapped file there
+    instead of in memory. Each variable is one contiguous run of bytes in
+    that file, so reading a few columns only pages in those.
+    """
+
+    def __init__(self, num_vars, capacity, variables=None, store=None):
+        self.num_vars = num_vars
+        self.capacity = capacity
+        if variables is None:
+            variables = np.arange(1, num_vars + 1)
+        self.variables = np.asarray(variables, dtype=np.int64)
+        self.row = np.full(num_vars + 1, -1, dtype=np.int64)
+        self.row[self.variables] = np.arange(len(self.variables))
+        self.store = store
+        self.bits = allocate((len(self.variables), 8 * ((capacity + 63) // 64)), np.uint8, store)
+        self.num_samples = 0
+        self.pending = np.empty((0, len(self.variables)), dtype=bool)
+
+    @classmethod
+    def from_bits(cls, bits, num_samples, capacity=None, num_vars=None, variables=None, store=None):
+        """Matrix holding the first num_samples samples of packed `bits`
+        (same layout as SampleMatrix.bits), with room for `capacity`."""
+        samples = cls(num_vars or len(bits), max(capacity or num_samples, num_samples), variables, store)
+        aligned = num_samples - num_samples % 8
+        samples.bits[:, :aligned // 8] = bits[:, :aligned // 8]
+        samples.num_samples = aligned
+        if aligned < num_samples:
+            samples.append(_unpack_rows(bits, aligned, num_samples))
+        return samples
+
+    @classmethod
+    def wrap(cls, bits, num_samples, num_vars, variables=None):
+        """Finished matrix over existing packed bits, without a copy."""
+        samples = cls(num_vars, 0, variables)
+        samples.bits = bits
+        samples.capacity = num_samples
+        samples.num_samples = num_samples
+        return samples
+
+    def __len__(self):
+        return self.num_samples + len(self.pending)
+
+    def full(self):
+        return len(self) >= self.capacity
+
+    def has(self, var):
+        return 0 < var <= self.num_vars and self.row[var] >= 0
+
+    def positions(self, variables):
+        """Rows of `bits` holding the variables."""
+        index = self.row[np.asarray(variables, dtype=np.int64)]
+        if (index < 0).any():
+            raise RuntimeError("variables were not sampled: %s" % (
+                np.asarray(variables)[index < 0].tolist()))
+        return index
+
+    def _pack(self, rows):
+        start = self.num_samples // 8
+        packed = np.packbits(rows, axis=0, bitorder="little")
+        self.bits[:, start:start + len(packed)] = packed.T
+        self.num_samples += len(rows)
+
+    def append(self, rows):
+        # rows: (k, len(variables)) bool, one sample per row; samples beyond capacity are dropped
+        rows = rows[:self.capacity - len(self)]
+        if len(self.pending):
+            rows = np.concatenate((self.pending, rows))
+        usable = len(rows) - len(rows) % 8
+        if usable:
+            self._pack(rows[:usable])
+        self.pending = rows[usable:]
+
+    def finish(self):
+        if len(self.pending):
+            self._pack(self.pending)
+            self.pending = self.pending[:0]
+        return self
+
+    def extend(self, other):
+        """Append the (finished) samples of another matrix over the same variables."""
+        assert np.array_equal(other.variables, self.variables)
+        if not len(self.pending) and self.num_samples % 8 == 0 and other.num_samples % 8 == 0:
+            start = self.num_samples // 8
+            count = other.num_samples // 8
+            self.bits[:, start:start + count] = other.bits[:, :count]
+            self.num_samples += other.num_samples
+            return
+        for start in range(0, other.num_samples, 4096):
+            self.append(other.rows(start, min(start + 4096, other.num_samples)))
+
+    def rows(self, start, stop):
+        """Samples start..stop-1 as a (stop - start, len(variables)) bool matrix; start is a multiple of 8."""
+        return _unpack_rows(self.bits, start, stop)
+
+    def words(self, var):
+        """Zero-copy uint64 view of the bits of var; padding bits are 0."""
+        return self.bits[self.positions([var])[0]].view(np.uint64)
+
+    def packed(self, variables=None):
+        """(len(variables), words) uint64 matrix of the bits of the variables,
+        covering the samples so far; padding bits are 0. Without variables
+        it is a zero-copy view of all rows of `bits`."""
+        rows = slice(None) if variables is None else self.positions(variables)
+        return self.bits[rows, :8 * ((self.num_samples + 63) // 64)].view(np.uint64)
+
+    def count_ones(self, variables):
+        """Number of samples in which each of the variables is true."""
+        index = self.positions(variables)
+        return popcount(self.bits[index].view(np.uint64))
+
+    def unpack_into(self, out, variables, block=256):
+        """out[:, j] = column(variables[j]); out is any (num_samples, k) array,
+        filled `block` variables at a time so no dense copy of the whole
+        selection is made."""
+        index = self.positions(variables)
+        for start in range(0, len(index), block):
+            part = self.bits[index[start:start + block]]
+            out[:, start:start + len(part)] = np.unpackbits(
+                part, axis=1, count=self.num_samples, bitorder="little").T
+        return out
+
+    def column(self, var):
+        return np.unpackbits(self.bits[self.positions([var])[0]], count=self.num_samples, bitorder="little")
+
+    def columns(self, variables, start=0, stop=None):
+        """Dense (stop - start, len(variables)) uint8 matrix of the given
+        variables, over samples start..stop-1 (default all)."""
+        index = self.positions(variables)
+        stop = self.num_samples if stop is None else min(stop, self.num_samples)
+        first = start - start % 8
+        block = self.bits[index, first // 8:(stop + 7) // 8]
+        return np.unpackbits(block, axis=1, count=stop - first, bitorder="little")[:, start - first:].T
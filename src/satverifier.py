@@ -0,0 +1,123 @@
+import numpy as np
+from pysat.solvers import Solver, SolverNames
+
+from src.logging_utils import cprint
+
+
+def _solver_name(preferred):
+    for name in (preferred, "cadical153", "glucose4"):
+        if name in vars(SolverNames):
+            return name
+    return "glucose4"
+
+
+class SatVerifier:
+    """Incremental in-process check of F(X, Y) & (W(X, Y') == Y') & ~F(X, Y').
+
+    Both copies of F are loaded into one pysat solver up front; ~F(X, Y')
+    uses one selector per clause (some selected clause has all its
+    literals false). Every gate of the SkolemCircuit is Tseitin-encoded
+    once, the first time it appears. Each wire w<y> gets a solver variable
+    tied to Y'_y; its definition w<y> == func[y] is guarded by an
+    activation literal, so when a repair changes func[y] only the new
+    gates and a fresh activation literal are added. The old literal is
+    retired with a unit clause and learned clauses survive.
+    """
+
+    def __init__(self, vindex, formula, solver="cadical153"):
+        self.vindex = vindex
+        Xvar = vindex.Xvar
+        Yvar = vindex.Yvar
+        self.top = max([formula.num_vars, formula.max_var()] + Xvar + Yvar)
+
+        # Y' is Y itself for uniquely defined variables
+        ymap = np.arange(self.top + 1, dtype=np.int64)
+        for var in Yvar:
+            if not vindex.is_unique(var):
+                ymap[var] = self.new_var()
+        self.Yprime = [int(ymap[var]) for var in Yvar]
+
+        name = _solver_name(solver)
+        self.solver = Solver(name=name, bootstrap_with=formula.clause_list())
+        cprint("c [SatVerifier] using", name)
+
+        literals = formula.literals.astype(np.int64)
+        renamed = np.sign(literals) * ymap[np.abs(literals)]
+        selectors = self.top + 1 + np.arange(len(formula), dtype=np.int64)
+        self.top += len(formula)
+        sel = selectors[formula.clause_ids()]
+        self.solver.append_formula(np.column_stack((-sel, -renamed)).tolist())
+        self.solver.add_clause(selectors.tolist())
+
+        # w<y> == Y'_y holds unconditionally; only the definitions of the
+        # wires change
+        self.wires = [self.new_var() for _ in Yvar]
+        for w, yprime in zip(self.wires, self.Yprime):
+            self.solver.add_clause([-w, yprime])
+            self.solver.add_clause([w, -yprime])
+
+        # aigvar maps circuit variables (inputs i, o, w, then gates) to solver variables
+        false = self.new_var()
+        self.solver.add_clause([-false])
+        self.aigvar = [false] + list(Xvar) + self.Yprime + self.wires
+        self.encoded = 0
+        self.active = {}
+
+    def new_var(self):
+        self.top += 1
+        return self.top
+
+    def _lit(self, lit):
+        var = self.aigvar[lit >> 1]
+        return -var if lit & 1 else var
+
+    def _encode_gates(self, aig):
+        gates = aig.ands[self.encoded:]
+        if not gates:
+            return
+        first = self.top + 1
+        self.top += len(gates)
+        self.aigvar.extend(range(first, self.top + 1))
+        self.encoded = len(aig.ands)
+
+        rhs = np.array(gates, dtype=np.int64)
+        aigvar = np.asarray(self.aigvar, dtype=np.int64)
+        lits = np.where(rhs & 1, -aigvar[rhs >> 1], aigvar[rhs >> 1])
+        out = np.arange(first, self.top + 1, dtype=np.int64)
+        clauses = [np.column_stack((-out, lits[:, 0])).tolist(),
+                   np.column_stack((-out, lits[:, 1])).tolist(),
+                   np.column_stack((out, -lits[:, 0], -lits[:, 1])).tolist()]
+        for part in clauses:
+            self.solver.append_formula(part)
+
+    def update(self, circuit):
+        self._encode_gates(circuit.aig)
+        for var, w in zip(self.vindex.Yvar, self.wires):
+            lit = circuit.func[var]
+            current = self.active.get(var)
+            if current is not None and current[0] == lit:
+                continue
+            if current is not None:
+                self.solver.add_clause([-current[1]])
+            act = self.new_var()
+            func = self._lit(lit)
+            self.solver.add_clause([-act, -w, func])
+            self.solver.add_clause([-act, w, -func])
+            self.active[var] = (lit, act)
+
+    def verify(self):
+        """Same contract as verify(): (1, [modelx, modely, modelyp], 1) on a
+        counterexample, (1, [], 0) once W is a Skolem function."""
+        assumptions = [act for _, act in self.active.values()]
+        if not self.solver.solve(assumptions=assumptions):
+            return (1, [], 0)
+        model = np.zeros(self.top + 1, dtype=np.int64)
+        values = np.asarray(self.solver.get_model(), dtype=np.int64)
+        model[np.abs(values)] = values > 0
+        modelx = model[self.vindex.Xvar]
+        modely = model[self.vindex.Yvar]
+        modelyp = model[self.Yprime]
+        return (1, [modelx, modely, modelyp], 1)
+
+    def close(self):
+        self.solver.delete()
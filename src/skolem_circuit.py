@@ -0,0 +1,114 @@
+from src.aig import AIG, FALSE, TRUE, assigns_aig, eval_expression, verilog_assigns
+
+
+class SkolemCircuit:
+    """The candidate Skolem functions as one structurally hashed AIG.
+
+    Inputs are i<x> (X), o<y> (Y', the Y inputs of SKOLEMFORMULA) and one
+    leaf per y standing for the wire w<y>, so a function that reads w<j>
+    sees every later repair of w<j>. func[y] is the current literal of
+    w<y>: core[y] (the learnt tree or the unique definition) with the
+    repairs in patches[y] folded in. A repair adds the gates of its cube
+    and one mux gate; nothing is re-read or re-written.
+    """
+
+    def __init__(self, vindex):
+        self.vindex = vindex
+        Xvar = vindex.Xvar
+        Yvar = vindex.Yvar
+        self.aig = AIG(len(Xvar) + 2 * len(Yvar))
+        self.names = (["i%s" % (var) for var in Xvar] + ["o%s" % (var) for var in Yvar]
+                      + ["w%s" % (var) for var in Yvar])
+        self.env = {name: self.aig.input(k) for k, name in enumerate(self.names)}
+        self.core = {}
+        self.func = {}
+        self.patches = {var: [] for var in Yvar}
+
+    def set_function(self, var, lit):
+        self.core[var] = lit
+        self.func[var] = lit
+        self.patches[var] = []
+
+    def set_expression(self, var, expr):
+        # expr uses the candidate syntax: ~, &, | over i<x>, w<y>, 0 and 1
+        self.set_function(var, eval_expression(self.aig, expr, self.env))
+
+    def set_definitions(self, UniqueDef, UniqueVars):
+        # utemp wires are internal to the definitions and get inlined
+        assigns = verilog_assigns(UniqueDef)
+        env = dict(self.env)
+        utemp = {name: tokens for name, tokens in assigns.items() if name.startswith("utemp")}
+        assigns_aig(self.aig, utemp, env, list(utemp))
+        for var in UniqueVars:
+            tokens = assigns.get("w%s" % (var))
+            if tokens is None:
+                raise RuntimeError("missing unique definition for w%s" % (var))
+            self.set_function(var, eval_expression(self.aig, " ".join(tokens), env))
+
+    def _cube(self, cube, final=False, var=None):
+        # cube is "l1 & l2 & ..." over i<x> / o<y>; in the final functions
+        # o<j> reads w<j> and the repaired variable's own literal is dropped,
+        # except as the first literal of the cube (which is how the Verilog
+        # rewrite of the beta wires treated it), so a cube of that literal
+        # alone never becomes the constant TRUE
+        lits = []
+        for k, term in enumerate(cube.split("&")):
+            term = term.strip()
+            neg = term.startswith("~")
+            name = term.lstrip("~").strip()
+            if final and name.startswith("o"):
+                if name == "o%s" % (var) and k > 0:
+                    continue
+                name = "w" + name[1:]
+            lits.append(self.env[name] ^ int(neg))
+        return self.aig.and_many(lits)
+
+    def _apply(self, lit, beta, mode):
+        if mode == 0:
+            return self.aig.or_(lit, beta)
+        return self.aig.and_(lit, beta ^ 1)
+
+    def patch(self, var, count, cube, mode):
+        """w<y> := w<y> | beta (mode 0) or w<y> & ~beta (mode 1)."""
+        self.patches[var].append((count, cube, mode))
+        self.func[var] = self._apply(self.func[var], self._cube(cube), mode)
+
+    def relearn(self, var, expr):
+        """Replace the core of var by a new candidate; its repairs stay."""
+        lit = eval_expression(self.aig, expr, self.env)
+        self.core[var] = lit
+        for _, cube, mode in self.patches[var]:
+            lit = self._apply(lit, self._cube(cube), mode)
+        self.func[var] = lit
+
+    def final_functions(self):
+        functions = {}
+        for var in self.vindex.Yvar:
+            lit = self.core[var]
+            for _, cube, mode in self.patches[var]:
+                lit = self._apply(lit, self._cube(cube, final=True, var=var), mode)
+            functions[var] = lit
+        return functions
+
+    def _name(self, lit):
+        if lit == FALSE:
+            return "1'b0"
+        if lit == TRUE:
+            return "1'b1"
+        var = lit >> 1
+        if var > self.aig.num_inputs:
+            name = "g%s" % (var)
+        else:
+            name = self.names[var - 1]
+        return "~" + name if lit & 1 else name
+
+    def write_functions(self, writer, functions):
+        # one wire per gate in the cone of the w<y>, then the w<y> themselves
+        gates = self.aig.cone(functions.values())
+        writer.wires("w%s" % (var) for var in self.vindex.Yvar)
+        writer.wires("g%s" % (var) for var in gates)
+        for var in gates:
+            a, b = self.aig.ands[var - self.aig.num_inputs - 1]
+            writer.write("assign g%s = %s & %s;\n" % (var, self._name(a), self._name(b)))
+        for var in self.vindex.Yvar:
+            writer.write("assign w%s = %s;\n" % (var, self._name(functions[var])))
@@ -8,3 +8,7 @@ atexit.register(_RUN_TEMP.cleanup)
 
 def temp_path(name):
     return os.path.join(_RUN_TEMP.name, name)
+
+
+def temp_dir():
+    return _RUN_TEMP.name
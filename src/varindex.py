@@ -0,0 +1,95 @@
+import heapq
+
+
+class VarIndex:
+    """Role and position lookups for the X and Y variables.
+
+    Filled in as the pipeline learns more: unates after preprocessing,
+    uniquely defined variables after unique_function, and the topological
+    order of Y once the candidates (and hence the dependency graph) exist.
+    """
+
+    def __init__(self, Xvar, Yvar):
+        self.Xvar = [int(v) for v in Xvar]
+        self.Yvar = [int(v) for v in Yvar]
+        self.xpos = {v: i for i, v in enumerate(self.Xvar)}
+        self.ypos = {v: i for i, v in enumerate(self.Yvar)}
+        self.posunate = set()
+        self.negunate = set()
+        self.unique = set()
+        self.order = []
+        self.order_pos = {}
+
+    def set_unates(self, PosUnate, NegUnate):
+        self.posunate = set(PosUnate)
+        self.negunate = set(NegUnate)
+
+    def set_unique(self, UniqueVars):
+        self.unique = set(UniqueVars)
+
+    def set_order(self, YvarOrder):
+        self.order = [int(v) for v in YvarOrder]
+        self.order_pos = {v: i for i, v in enumerate(self.order)}
+
+    def is_x(self, var):
+        return var in self.xpos
+
+    def is_y(self, var):
+        return var in self.ypos
+
+    def is_unate(self, var):
+        return var in self.posunate or var in self.negunate
+
+    def is_unique(self, var):
+        return var in self.unique
+
+    def is_known(self, var):
+        # functions of unates and uniquely defined variables are never learnt or repaired
+        return var in self.unique or var in self.posunate or var in self.negunate
+
+    def sort_by_order(self, variables, reverse=False):
+        return sorted(set(int(v) for v in variables), key=self.order_pos.__getitem__, reverse=reverse)
+
+
+class RepairWorklist:
+    """Y variables awaiting repair, popped in decreasing topological position.
+
+    A variable is only ever queued once; `in` answers whether it has been
+    queued at all, is_pending() whether it still waits to be popped.
+    """
+
+    def __init__(self, vindex, variables):
+        self.vindex = vindex
+        self.heap = []
+        self.seen = set()
+        self.pending = set()
+        self.initial = set()
+        for var in variables:
+            if self.push(var):
+                self.initial.add(int(var))
+
+    def push(self, var):
+        var = int(var)
+        if var in self.seen:
+            return False
+        self.seen.add(var)
+        self.pending.add(var)
+        heapq.heappush(self.heap, (-self.vindex.order_pos[var], var))
+        return True
+
+    def pop(self):
+        _, var = heapq.heappop(self.heap)
+        self.pending.discard(var)
+        return var
+
+    def is_pending(self, var):
+        return var in self.pending
+
+    def __contains__(self, var):
+        return var in self.seen
+
+    def queued(self):
+        return len(self.seen)
+
+    def __bool__(self):
+        return bool(self.heap)
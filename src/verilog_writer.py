@@ -0,0 +1,103 @@
+_FLUSH_SIZE = 1 << 20
+
+
+def _wrap_assign(expr, indent="  ", max_terms=200, max_len=4000):
+	if " | " in expr:
+		terms = [t.strip() for t in expr.split(" | ") if t.strip()]
+		sep = " | "
+	elif " & " in expr:
+		terms = [t.strip() for t in expr.split(" & ") if t.strip()]
+		sep = " & "
+	else:
+		return expr
+	if not terms:
+		return ""
+	return _wrap_terms(terms, sep, indent, max_terms, max_len)
+
+
+def _wrap_terms(terms, sep, indent="  ", max_terms=200, max_len=4000):
+	# joins terms with sep, breaking the line every max_terms terms or
+	# max_len characters so that no single source line gets huge
+	lines = []
+	current = []
+	current_len = 0
+	for term in terms:
+		if current and (len(current) >= max_terms or current_len + len(sep) + len(term) > max_len):
+			lines.append(sep.join(current))
+			current = []
+			current_len = 0
+		if current:
+			current_len += len(sep)
+		current.append(term)
+		current_len += len(term)
+	if current:
+		lines.append(sep.join(current))
+	return (sep + "\n" + indent).join(lines)
+
+
+class VerilogWriter:
+	"""Emits Verilog to a file object in large chunks.
+
+	Statements are buffered as a list of strings and joined once per flush,
+	so building a module never concatenates onto a growing string.
+	"""
+
+	def __init__(self, out, flush_size=_FLUSH_SIZE):
+		self.out = out
+		self.flush_size = flush_size
+		self.parts = []
+		self.size = 0
+		self.wire_count = 0
+
+	def write(self, text):
+		self.parts.append(text)
+		self.size += len(text)
+		if self.size >= self.flush_size:
+			self.flush()
+
+	def flush(self):
+		if self.parts:
+			self.out.write("".join(self.parts))
+			self.parts = []
+			self.size = 0
+
+	def module(self, name, ports):
+		self.write("module %s (%s);\n" % (name, ", ".join(ports)))
+
+	def endmodule(self):
+		self.write("endmodule\n")
+		self.flush()
+
+	def inputs(self, names):
+		self.write("".join("input %s;\n" % (name) for name in names))
+
+	def outputs(self, names):
+		self.write("".join("output %s;\n" % (name) for name in names))
+
+	def wires(self, names):
+		self.write("".join("wire %s;\n" % (name) for name in names))
+
+	def assign(self, lhs, expr, indent="  "):
+		self.write("assign %s = %s;\n" % (lhs, _wrap_assign(expr, indent=indent)))
+
+	def assign_terms(self, lhs, terms, op, indent="  "):
+		self.write("assign %s = %s;\n" % (lhs, _wrap_terms(terms, " %s " % (op), indent)))
+
+	def balanced_tree(self, lhs, terms, op, prefix, fanin=16):
+		# Reduces terms with op through a tree of fresh wires prefix<k> of
+		# at most `fanin` inputs each, so the depth is log_fanin(len(terms)).
+		terms = list(terms)
+		if not terms:
+			self.write("assign %s = %s;\n" % (lhs, "1'b1" if op == "&" else "1'b0"))
+			return
+		while len(terms) > fanin:
+			level = []
+			for start in range(0, len(terms), fanin):
+				self.wire_count += 1
+				name = "%s%s" % (prefix, self.wire_count)
+				self.write("wire %s;\n" % (name))
+				self.assign_terms(name, terms[start:start + fanin], op)
+				level.append(name)
+			terms = level
+		self.assign_terms(lhs, terms, op)
+
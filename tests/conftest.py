@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+# the tests import the pipeline as `src.*`, like manthan.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _simulate(aig, inputs, width=1):
+    # values of every AIG variable, bit-parallel over width-bit integers;
+    # inputs holds one integer per input in order
+    mask = (1 << width) - 1
+    values = [0] + list(inputs)
+    for a, b in aig.ands:
+        values.append((values[a >> 1] ^ (mask if a & 1 else 0)) & (values[b >> 1] ^ (mask if b & 1 else 0)))
+    return lambda lit: values[lit >> 1] ^ (mask if lit & 1 else 0)
+
+
+@pytest.fixture
+def simulate():
+    return _simulate
+
+
+# writes n samples of "p cnf" variables, deterministic in the seed; unit
+# clauses fix their variable, "w v p" biases it
+_FAKE_CMSGEN = r"""#!%s
+import random
+import sys
+
+argv = sys.argv
+num = int(argv[argv.index("--samples") + 1])
+seed = int(argv[argv.index("-s") + 1])
+lines = open(argv[-1]).read().split("\n")
+num_vars = int([line for line in lines if line.startswith("p cnf")][0].split()[2])
+weight = {}
+for line in lines:
+    tokens = line.split()
+    if tokens[:1] == ["w"]:
+        weight[int(tokens[1])] = float(tokens[2])
+    elif len(tokens) == 2 and tokens[1] == "0" and tokens[0].lstrip("-").isdigit():
+        weight[abs(int(tokens[0]))] = 1.0 if int(tokens[0]) > 0 else 0.0
+rng = random.Random(seed)
+with open(argv[argv.index("--samplefile") + 1], "w") as f:
+    for _ in range(num):
+        f.write(" ".join(str(v if rng.random() < weight.get(v, 0.5) else -v) for v in range(1, num_vars + 1)))
+        f.write(" 0\n")
+"""
+
+
+@pytest.fixture
+def fake_cmsgen(tmp_path, monkeypatch):
+    # runs the sampler in tmp_path, where ./dependencies/cmsgen is the fake
+    path = tmp_path / "dependencies" / "cmsgen"
+    path.parent.mkdir()
+    path.write_text(_FAKE_CMSGEN % (sys.executable))
+    path.chmod(0o755)
+    monkeypatch.chdir(tmp_path)
+    return path
@@ -0,0 +1,60 @@
+import types
+
+import pytest
+
+from src.abc_session import AbcSession
+
+
+class _Function:
+    # a ctypes function: callable, with settable argtypes/restype
+    def __init__(self, call):
+        self.call = call
+
+    def __call__(self, *args):
+        return self.call(*args)
+
+
+class _FakeAbc:
+    """Stands in for libabc: records commands and reports a fixed sat status."""
+
+    def __init__(self, status, cex):
+        self.status = status
+        self.cex = cex
+        self.commands = []
+        self.Abc_Start = _Function(lambda: None)
+        self.Abc_Stop = _Function(lambda: None)
+        self.Abc_FrameGetGlobalFrame = _Function(lambda: 1)
+        self.Cmd_CommandExecute = _Function(self._execute)
+        self.Abc_FrameReadProbStatus = _Function(lambda frame: self.status)
+
+    def _execute(self, frame, command):
+        command = command.decode()
+        self.commands.append(command)
+        if command.startswith("write_cex") and self.cex is not None:
+            with open(command.split()[-1], "w") as f:
+                f.write(self.cex)
+        return 0
+
+
+def _session(tmp_path, status, cex=None):
+    miter = types.SimpleNamespace(write_base=lambda path: None, add_skolem=lambda circuit: None,
+                                  write_skolem_cone=lambda path: None, names=["1", "2", "ip2"])
+    return AbcSession(_FakeAbc(status, cex), miter, str(tmp_path), verbose=2)
+
+
+def test_unsat_is_a_valid_skolem_function(tmp_path):
+    session = _session(tmp_path, 1)
+    assert session.verify(None, [1], [2]) == (1, [], 0)
+    assert not any(command.startswith("write_cex") for command in session.lib.commands)
+
+
+def test_sat_returns_the_counterexample(tmp_path):
+    check, (modelx, modely, modelyp), ret = _session(tmp_path, 0, "101").verify(None, [1], [2])
+    assert (check, ret) == (1, 1)
+    assert (modelx.tolist(), modely.tolist(), modelyp.tolist()) == ([1], [0], [1])
+
+
+@pytest.mark.parametrize("status, cex", [(-1, None), (0, None), (0, "")])
+def test_undecided_or_missing_cex_falls_back(tmp_path, status, cex):
+    # None makes manthan fall back to one abc process per check
+    assert _session(tmp_path, status, cex).verify(None, [1], [2]) is None
@@ -0,0 +1,124 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from src.aig import ErrorMiter, parse_cex
+from src.qdimacs import load_qdimacs
+from src.skolem_circuit import SkolemCircuit
+from src.varindex import VarIndex
+
+
+# y3 = x1 & x2, y4 | x1, y4 -> y3 | x2
+QDIMACS = "p cnf 4 5\na 1 2 0\ne 3 4 0\n-3 1 0\n-3 2 0\n3 -1 -2 0\n4 1 0\n-4 3 2 0\n"
+
+
+def _formula(tmp_path):
+    path = tmp_path / "toy.qdimacs"
+    path.write_text(QDIMACS)
+    return load_qdimacs(str(path))
+
+
+def _satisfies(clauses, value):
+    return all(any(value[abs(lit)] == (lit > 0) for lit in clause) for clause in clauses)
+
+
+def _read_aiger(path):
+    # header, outputs and and-gates of a binary AIGER file
+    data = open(path, "rb").read()
+    header, rest = data.split(b"\n", 1)
+    _, maxvar, inputs, latches, outputs, ands = header.split()
+    inputs, outputs, ands = int(inputs), int(outputs), int(ands)
+    lines = rest.split(b"\n", outputs)
+    outs = [int(line) for line in lines[:outputs]]
+    body = lines[outputs]
+    pos = 0
+
+    def varint():
+        nonlocal pos
+        value = shift = 0
+        while True:
+            byte = body[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value
+
+    gates = []
+    for k in range(ands):
+        lhs = 2 * (inputs + 1 + k)
+        a = lhs - varint()
+        gates.append((a, a - varint()))
+    return int(maxvar), inputs, outs, gates
+
+
+@pytest.mark.parametrize("unique", [[], [3]])
+@pytest.mark.parametrize("w3", ["(i1 & i2)", "i1"])
+def test_miter_is_the_error_formula(tmp_path, simulate, unique, w3):
+    # out(X, Y, Y', W) == F(X, Y) & W == Y' & W == f(X, Y') & ~F(X, Y'),
+    # checked on every assignment of the miter's inputs
+    formula = _formula(tmp_path)
+    clauses = formula.clause_list()
+    vindex = VarIndex([1, 2], [3, 4])
+    vindex.set_unique(unique)
+    circuit = SkolemCircuit(vindex)
+    circuit.set_expression(3, w3)
+    circuit.set_expression(4, "(~i1 | w3)")
+    miter = ErrorMiter(vindex, formula)
+    out = miter.add_skolem(circuit)
+
+    num_inputs = miter.aig.num_inputs
+    assert num_inputs == 8
+    found = False
+    for bits in itertools.product([0, 1], repeat=num_inputs):
+        x1, x2, y3, y4, p3, p4, w3v, w4v = bits
+        if 3 in unique:
+            p3 = y3
+        value = simulate(miter.aig, bits)
+        f = simulate(circuit.aig, [x1, x2, p3, p4, w3v, w4v])
+        xy = {1: x1, 2: x2, 3: y3, 4: y4}
+        xyp = {1: x1, 2: x2, 3: p3, 4: p4}
+        equal = (w3v, w4v) == (p3, p4) and f(circuit.func[3]) == p3 and f(circuit.func[4]) == p4
+        expected = _satisfies(clauses, xy) and equal and not _satisfies(clauses, xyp)
+        assert value(out) == expected, bits
+        found |= expected
+    # only the wrong w3 has a counterexample; as a unique variable Y'3 is
+    # Y3 = x1 & x2, and w3 == Y'3 rules out every input where w3 is wrong
+    assert found == (w3 == "i1" and not unique)
+
+
+def test_miter_aiger_round_trip(tmp_path):
+    formula = _formula(tmp_path)
+    vindex = VarIndex([1, 2], [3, 4])
+    circuit = SkolemCircuit(vindex)
+    circuit.set_expression(3, "i1")
+    circuit.set_expression(4, "(~i1 | w3)")
+    miter = ErrorMiter(vindex, formula)
+    out = miter.add_skolem(circuit)
+    path = str(tmp_path / "miter.aig")
+    miter.write(path)
+    maxvar, inputs, outs, gates = _read_aiger(path)
+    assert (inputs, outs, gates) == (miter.aig.num_inputs, [out], miter.aig.ands)
+    assert maxvar == inputs + len(gates)
+
+
+def test_parse_cex_bit_string_like_the_verilog_verifier():
+    # abc's plain bit string, in input order; extra bits are ignored
+    names = ["1", "2", "3", "ip3"]
+    assert parse_cex("0110", names) == [0, 1, 1, 0]
+    assert parse_cex("011011", names) == [0, 1, 1, 0]
+    assert parse_cex("01 10\n", names) == [0, 1, 1, 0]
+
+
+def test_parse_cex_named_values():
+    names = ["1", "2", "3", "ip3"]
+    assert parse_cex("ip3=1 1=0 3=0 2=1", names) == [0, 1, 0, 1]
+    assert parse_cex("1=0 2=1", names) is None
+
+
+def test_parse_cex_rejects_short_or_garbled_models():
+    names = ["1", "2", "3"]
+    assert parse_cex("01", names) is None
+    assert parse_cex("0x1", names) is None
+    assert np.array_equal(parse_cex("101", names), [1, 0, 1])
@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.cache import FormulaCache
+
+
+def _cache(tmp_path):
+    inputfile = tmp_path / "formula.qdimacs"
+    inputfile.write_text("p cnf 1 1\ne 1 0\n1 0\n")
+    return FormulaCache(str(tmp_path / "cache"), str(inputfile))
+
+
+def test_unates_round_trip(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.load_unates() is None
+    cache.save_unates([1, 2], [3])
+    assert cache.load_unates() == ([1, 2], [3])
+    cache.save_unates([], [])
+    assert cache.load_unates() == ([], [])
+
+
+def test_torn_unates_are_a_miss(tmp_path):
+    cache = _cache(tmp_path)
+    cache.save_unates([1, 2], [3])
+    # a concurrent save replaced only one of the arrays
+    np.save(cache._file("negunate.npy"), np.array([4], dtype=np.int32))
+    assert cache.load_unates() is None
@@ -0,0 +1,56 @@
+import types
+
+import numpy as np
+from sklearn import tree
+
+from src import candidateSkolem
+from src.samplematrix import SampleMatrix
+from src.varindex import VarIndex
+
+
+def _args(**kwargs):
+    args = dict(multiclass=1, multioutput=0, gini=0.005, seed=10, showtrees=0, verbose=0,
+                learner="sklearn", sample_mem_frac=0.3)
+    args.update(kwargs)
+    return types.SimpleNamespace(**args)
+
+
+def _samples(num_samples=500):
+    # x1..x6; y7 = (x1 & x2) | x3, y8 = x4 ^ y7, with few distinct rows
+    rng = np.random.default_rng(3)
+    dense = np.zeros((num_samples, 8), dtype=np.uint8)
+    dense[:, :6] = rng.integers(0, 2, (num_samples, 6))
+    dense[:, 3:6] = 0
+    dense[:, 6] = (dense[:, 0] & dense[:, 1]) | dense[:, 2]
+    dense[:, 7] = dense[:, 3] ^ dense[:, 6]
+    samples = SampleMatrix(8, num_samples)
+    samples.append(dense.astype(bool))
+    return dense, samples.finish()
+
+
+def test_unique_rows_match_np_unique():
+    dense, samples = _samples()
+    featname = [1, 2, 3, 4, 5, 8]
+    labeldata = candidateSkolem.binary_to_int(dense[:, [6]])
+    rows, counts, packed = candidateSkolem.uniqueRows(samples, featname, labeldata)
+    table = np.hstack([dense[:, [0, 1, 2, 3, 4, 7]], labeldata])
+    _, first, expected = np.unique(table, axis=0, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    assert np.array_equal(rows, first[order])
+    assert np.array_equal(counts, expected[order])
+    assert np.array_equal(np.unpackbits(packed, axis=1, count=len(featname)), table[rows, :-1])
+
+
+def test_fit_cluster_matches_sklearn_on_all_rows():
+    dense, samples = _samples()
+    vindex = VarIndex([1, 2, 3, 4, 5, 6], [7, 8])
+    args = _args()
+    featname = vindex.Xvar + [8]
+    _, _, clf = candidateSkolem.fitCluster(vindex, samples, featname, [7], args)
+    # the baseline: sklearn on every (dense) sample, unweighted
+    labeldata = candidateSkolem.binary_to_int(dense[:, [6]])
+    full = tree.DecisionTreeClassifier(criterion="gini", min_impurity_decrease=args.gini, random_state=args.seed)
+    full.fit(dense[:, [0, 1, 2, 3, 4, 5, 7]], labeldata)
+    assert np.array_equal(clf.tree_.feature, full.tree_.feature)
+    assert np.array_equal(clf.tree_.children_left, full.tree_.children_left)
+    assert np.array_equal(clf.predict(dense[:, [0, 1, 2, 3, 4, 5, 7]]), full.predict(dense[:, [0, 1, 2, 3, 4, 5, 7]]))
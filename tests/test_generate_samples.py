@@ -0,0 +1,79 @@
+import types
+
+import numpy as np
+import pytest
+
+from src import generateSamples
+
+CNF = "p cnf 20 2\n1 0\n-2 0\n"
+
+
+def _args(**kwargs):
+    args = dict(seed=7, sample_mem_frac=0, sampling_workers=1, verbose=0)
+    args.update(kwargs)
+    return types.SimpleNamespace(**args)
+
+
+def _draw(args, num_samples=300):
+    samples = generateSamples.generatesample(args, num_samples, CNF, "toy", 0)
+    return samples.columns(range(1, 21))
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_sample_file_fallback_matches_the_pipe(fake_cmsgen, monkeypatch, workers):
+    piped = _draw(_args(sampling_workers=workers))
+    monkeypatch.setattr(generateSamples, "_PIPE_SAMPLES", False)
+    assert np.array_equal(_draw(_args(sampling_workers=workers)), piped)
+    assert piped.shape == (300, 20)
+    assert piped[:, 0].all() and not piped[:, 1].any()
+
+
+def test_memory_cap_is_no_stricter_than_one_byte_per_variable(monkeypatch):
+    available = 1 << 20
+    monkeypatch.setattr(generateSamples.psutil, "virtual_memory",
+                        lambda: types.SimpleNamespace(available=available))
+    for num_vars in (1, 7, 64, 1000):
+        # the baseline kept available * frac // num_vars rows
+        baseline = int(available * 0.5 // num_vars)
+        assert generateSamples._max_rows_from_memory(num_vars, 10 ** 9, 0.5) >= baseline
+    assert generateSamples._max_rows_from_memory(1000, 10, 0.5) == 10
+    assert generateSamples._max_rows_from_memory(1000, 10 ** 9, 0) == 10 ** 9
+
+
+def _failing(monkeypatch, times):
+    # the first `times` draws of the second worker's share fail
+    run = generateSamples._run_cmsgen
+    seed = generateSamples._worker_seeds(7, 3)[1]
+    calls = []
+
+    def flaky(cmsgen, tmpdir, num_samples, worker_seed, *rest):
+        if worker_seed == seed and len(calls) < times:
+            calls.append(worker_seed)
+            raise RuntimeError("sample generation failed")
+        return run(cmsgen, tmpdir, num_samples, worker_seed, *rest)
+    monkeypatch.setattr(generateSamples, "_run_cmsgen", flaky)
+    return calls
+
+
+def test_failed_worker_share_is_drawn_again(fake_cmsgen, monkeypatch):
+    expected = _draw(_args(sampling_workers=3))
+    calls = _failing(monkeypatch, 1)
+    assert np.array_equal(_draw(_args(sampling_workers=3)), expected)
+    assert len(calls) == 1
+
+
+def test_worker_failing_twice_is_raised(fake_cmsgen, monkeypatch):
+    _failing(monkeypatch, 2)
+    with pytest.raises(RuntimeError):
+        _draw(_args(sampling_workers=3))
+
+
+def test_bias_ratios_and_weight_lines_match_the_baseline():
+    # every count of the 500-sample probes, against round(count / 500, 2)
+    counts = np.arange(501)
+    samples = type("Probe", (), {"count_ones": lambda self, variables: counts, "__len__": lambda self: 500})()
+    ratios = generateSamples._rounded_ratios(samples, counts)
+    baseline = [round(float(count) / 500, 2) for count in counts.tolist()]
+    assert ratios.tolist() == baseline
+    assert generateSamples._bias_weights(counts, ratios) == "".join(
+        "w %s %s\n" % (yvar, p) for yvar, p in zip(counts.tolist(), baseline))
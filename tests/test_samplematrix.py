@@ -0,0 +1,34 @@
+import numpy as np
+
+from src.samplematrix import SampleMatrix
+
+
+def _matrix(dense, chunks=(None,)):
+    samples = SampleMatrix(dense.shape[1], len(dense))
+    start = 0
+    for stop in chunks:
+        stop = len(dense) if stop is None else stop
+        samples.append(dense[start:stop].astype(bool))
+        start = stop
+    return samples.finish()
+
+
+def test_columns_and_count_ones_round_trip():
+    dense = np.random.default_rng(0).integers(0, 2, (301, 13)).astype(np.uint8)
+    samples = _matrix(dense, (150, None))
+    variables = list(range(1, 14))
+    assert np.array_equal(samples.columns(variables), dense)
+    assert np.array_equal(samples.columns([5, 2], 8, 200), dense[8:200][:, [4, 1]])
+    assert np.array_equal(samples.count_ones(variables), dense.sum(axis=0))
+
+
+def test_extend_after_an_unaligned_part():
+    rng = np.random.default_rng(1)
+    first = rng.integers(0, 2, (13, 9)).astype(np.uint8)
+    second = rng.integers(0, 2, (16, 9)).astype(np.uint8)
+    combined = SampleMatrix(9, len(first) + len(second))
+    combined.extend(_matrix(first))
+    combined.extend(_matrix(second))
+    combined.finish()
+    assert len(combined) == 29
+    assert np.array_equal(combined.columns(range(1, 10)), np.vstack([first, second]))
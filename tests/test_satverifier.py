@@ -0,0 +1,73 @@
+import pytest
+
+from src.aig import ErrorMiter
+from src.qdimacs import load_qdimacs
+from src.satverifier import SatVerifier
+from src.skolem_circuit import SkolemCircuit
+from src.varindex import VarIndex
+
+pytest.importorskip("pysat")
+
+# y3 = x1 & x2, y4 | x1, y4 -> y3 | x2
+QDIMACS = "p cnf 4 5\na 1 2 0\ne 3 4 0\n-3 1 0\n-3 2 0\n3 -1 -2 0\n4 1 0\n-4 3 2 0\n"
+
+
+def _setup(tmp_path, w3, unique=()):
+    path = tmp_path / "toy.qdimacs"
+    path.write_text(QDIMACS)
+    formula = load_qdimacs(str(path))
+    vindex = VarIndex([1, 2], [3, 4])
+    vindex.set_unique(unique)
+    circuit = SkolemCircuit(vindex)
+    circuit.set_expression(3, w3)
+    circuit.set_expression(4, "(~i1 | w3)")
+    return formula, vindex, circuit
+
+
+def _is_cex(formula, vindex, circuit, cex, simulate):
+    # a counterexample sets the miter's output; its W inputs equal Y'
+    modelx, modely, modelyp = cex
+    miter = ErrorMiter(vindex, formula)
+    out = miter.add_skolem(circuit)
+    yprime = [y if vindex.is_unique(var) else p for var, y, p in zip(vindex.Yvar, modely, modelyp)]
+    value = simulate(miter.aig, list(modelx) + list(modely) + list(modelyp) + yprime)
+    return value(out) == 1
+
+
+@pytest.mark.parametrize("w3, unique", [("(i1 & i2)", ()), ("i1", (3,))])
+def test_valid_skolem_function_is_unsat(tmp_path, w3, unique):
+    # as a unique variable Y'3 is Y3 = x1 & x2, so a wrong w3 is never used
+    formula, vindex, circuit = _setup(tmp_path, w3, unique)
+    verifier = SatVerifier(vindex, formula)
+    verifier.update(circuit)
+    assert verifier.verify() == (1, [], 0)
+    verifier.close()
+
+
+def test_counterexample_satisfies_the_miter(tmp_path, simulate):
+    formula, vindex, circuit = _setup(tmp_path, "i1")
+    verifier = SatVerifier(vindex, formula)
+    verifier.update(circuit)
+    check, cex, ret = verifier.verify()
+    assert (check, ret) == (1, 1)
+    assert _is_cex(formula, vindex, circuit, cex, simulate)
+    # x1 = 1, x2 = 0 is the only input where w3 = i1 is wrong
+    assert cex[0].tolist() == [1, 0]
+    verifier.close()
+
+
+def test_repair_is_picked_up_incrementally(tmp_path, simulate):
+    formula, vindex, circuit = _setup(tmp_path, "i1")
+    verifier = SatVerifier(vindex, formula)
+    verifier.update(circuit)
+    assert verifier.verify()[2] == 1
+    # w3 := w3 & ~(i1 & ~i2) repairs it; only the new gates are encoded
+    circuit.patch(3, 1, "i1 & ~i2", 1)
+    verifier.update(circuit)
+    assert verifier.verify() == (1, [], 0)
+    # a repair that breaks it again is found again
+    circuit.patch(3, 2, "i1 & ~i2", 0)
+    verifier.update(circuit)
+    check, cex, ret = verifier.verify()
+    assert ret == 1 and _is_cex(formula, vindex, circuit, cex, simulate)
+    verifier.close()
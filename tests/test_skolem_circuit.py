@@ -0,0 +1,66 @@
+import pytest
+
+from src.aig import TRUE, eval_expression
+from src.skolem_circuit import SkolemCircuit
+from src.varindex import VarIndex
+
+
+def _truth_table(num_inputs):
+    # input k of every assignment of num_inputs inputs, as 2^n-bit integers
+    width = 1 << num_inputs
+    return [sum(1 << j for j in range(width) if j >> k & 1) for k in range(num_inputs)], width
+
+
+def _baseline_beta(var, cube):
+    # the rewrite createSkolemfunction applied to "assign beta<var>_<n> = ( cube );"
+    line = "( %s )" % (cube)
+    line = line.replace("& ~o%s" % (var), "")
+    line = line.replace("& o%s" % (var), "")
+    return line.replace("o", "w")
+
+
+@pytest.mark.parametrize("cube, mode", [
+    ("o5", 0),
+    ("~o5", 1),
+    ("i1 & ~o5", 0),
+    ("i1 & ~i2 & o6 & o5", 1),
+    ("~i2 & ~o6", 0),
+])
+def test_final_functions_match_the_verilog_rewrite(simulate, cube, mode):
+    vindex = VarIndex([1, 2], [5, 6])
+    circuit = SkolemCircuit(vindex)
+    circuit.set_expression(5, "(i1 & ~i2)")
+    circuit.set_expression(6, "(i2 | w5)")
+    circuit.patch(5, 1, cube, mode)
+    final = circuit.final_functions()[5]
+
+    beta = _baseline_beta(5, cube)
+    expected = "(( (i1 & ~i2) ) | ( %s ) )" if mode == 0 else "(( (i1 & ~i2) ) & ~( %s ) )"
+    expected = eval_expression(circuit.aig, expected % (beta), circuit.env)
+
+    inputs, width = _truth_table(circuit.aig.num_inputs)
+    value = simulate(circuit.aig, inputs, width)
+    assert value(final) == value(expected)
+
+
+def test_cube_of_the_own_literal_is_not_constant():
+    # dropping the only literal would make beta TRUE and w5 constant
+    vindex = VarIndex([1], [5])
+    circuit = SkolemCircuit(vindex)
+    circuit.set_expression(5, "i1")
+    circuit.patch(5, 1, "o5", 0)
+    final = circuit.final_functions()[5]
+    assert final not in (TRUE, TRUE ^ 1)
+    assert final == circuit.aig.or_(circuit.env["i1"], circuit.env["w5"])
+
+
+def test_relearn_keeps_the_repairs(simulate):
+    vindex = VarIndex([1, 2], [5])
+    circuit = SkolemCircuit(vindex)
+    circuit.set_expression(5, "i1")
+    circuit.patch(5, 1, "i1 & i2", 1)
+    circuit.relearn(5, "i2")
+    expected = eval_expression(circuit.aig, "(i2 & ~(i1 & i2))", circuit.env)
+    inputs, width = _truth_table(circuit.aig.num_inputs)
+    value = simulate(circuit.aig, inputs, width)
+    assert value(circuit.func[5]) == value(expected)